@@ -1,22 +1,53 @@
 import os
-from flask import Flask, jsonify
+from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
 from models import db, setup_db
 import routes
 import auth
 import errors
+import commands
+import profiler
+import http_cache
+import live
+import json_provider
+from json_provider import jsonify
 
 
 def create_app(test_config=None):
 
     app = Flask(__name__)
+    if test_config:
+        app.config.update(test_config)
+    json_provider.init_app(app)
     setup_db(app, os.environ['DATABASE_URL'])
     migrate = Migrate(app, db)
+    profiler.init_app(app)
+    # Cache-Control policy of GET endpoints. Game catalog is public and rarely changes, match and tournament details
+    # must be revalidated (cheap, see ETag/Last-Modified support), listings depend on the logged user
+    app.config['CACHE_CONTROL'] = {
+        'game.get_games': 'public, max-age=60',
+        'game.get_game': 'public, max-age=60',
+        'match.get_matches': 'private, no-cache',
+        'match.get_match': 'no-cache',
+        'match.match_users': 'no-cache',
+        'tournament.get_games': 'no-cache',
+        'tournament.get_tournament': 'no-cache',
+        'tournament.get_tournament_matches': 'private, no-cache',
+        'tournament.get_tournament_participants': 'no-cache',
+        'tournament.get_bracket': 'no-cache',
+        'tournament.get_standings': 'no-cache',
+    }
+    http_cache.init_app(app)
+    live.init_app(app)
     CORS(app)
     app.register_blueprint(routes.game_blueprint)
     app.register_blueprint(routes.match_blueprint)
     app.register_blueprint(routes.tournament_blueprint)
+    app.register_blueprint(routes.internal_blueprint)
+    commands.register_commands(app)
+    # Warm up JWKS cache so the first authenticated request doesn't wait for it
+    auth.JWKS.refresh_async()
 
     @app.after_request
     def after_request(response):
@@ -43,6 +74,7 @@ def create_app(test_config=None):
     app.register_error_handler(403, errors.forbidden_error)
     app.register_error_handler(404, errors.not_found_error)
     app.register_error_handler(500, errors.server_error)
+    app.register_error_handler(auth.AuthError, errors.auth_error)
 
     return app
 
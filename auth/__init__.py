@@ -1,17 +1,30 @@
 import os
-import json
-from flask import request, _request_ctx_stack, session
+import time
+import hashlib
+from flask import request, _request_ctx_stack, session, g
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
-from models import User, UserAccount
+from models import User
+from cache import LRUCache, make_cache
+from auth.jwks import JWKSCache, urlopen_fetcher
 
 
 AUTH0_DOMAIN = os.environ['AUTH0_DOMAIN']
 API_AUDIENCE = os.environ['AUTH0_API_AUDIENCE']
 ALGORITHMS = os.environ['JWT_ALGORITHMS'].split(',')
 
-JWK = None  # This will store (on runtime) JWK to validate JWT
+# JWKS used to validate JWT, fetched on runtime and refreshed in background
+JWKS = JWKSCache(
+    urlopen_fetcher('https://{}/.well-known/jwks.json'.format(AUTH0_DOMAIN)),
+    ttl=int(os.environ.get('JWKS_CACHE_TTL', 3600)),
+    stale_ttl=int(os.environ.get('JWKS_STALE_TTL', 86400)),
+)
+
+# Payloads of already verified JWT, keyed by token hash and kept until the token expires
+TOKEN_CACHE = LRUCache(maxsize=int(os.environ.get('JWT_CACHE_SIZE', 4096)))
+
+# Ids of already provisioned users, keyed by their oauth id
+USER_ID_CACHE = make_cache('user-id', maxsize=int(os.environ.get('USER_CACHE_SIZE', 4096)))
 
 ## AuthError Exception
 '''
@@ -59,8 +72,7 @@ def get_token_auth_header():
 '''
 def check_permissions(permission, payload):
     if not payload:
-        token = get_token_auth_header()
-        payload = verify_decode_jwt(token)
+        payload = get_token_payload()
     if 'permissions' not in payload:
         raise AuthError('Permissions are not included in JWT', 403)
     if permission not in payload['permissions']:
@@ -82,16 +94,42 @@ def check_permissions(permission, payload):
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
 def verify_decode_jwt(token):
-    global JWK
-    if not JWK:
-        JWK = json.loads(urlopen('https://{}/.well-known/jwks.json'.format(AUTH0_DOMAIN)).read())
     try:
-        payload = jwt.decode(token, JWK, ALGORITHMS, audience=API_AUDIENCE)
+        kid = jwt.get_unverified_header(token).get('kid')
+    except Exception as e:
+        raise AuthError(repr(e), 401)
+    try:
+        jwks = JWKS.get(kid)
+    except Exception as e:
+        # Signing keys unavailable (i.e. identity provider down on a cold worker): the token can't be verified
+        raise AuthError('Unable to fetch JWKS: {!r}'.format(e), 503)
+    try:
+        payload = jwt.decode(token, jwks, ALGORITHMS, audience=API_AUDIENCE)
         return payload
     except Exception as e:
         raise AuthError(repr(e), 401)
 
 
+def get_token_payload():
+    """
+    get_token_payload()
+        return the verified payload of the request bearer token. The payload is memoized on the request and in
+        TOKEN_CACHE, so a token signature is checked once until the token expires
+    """
+    token = get_token_auth_header()
+    request_payload = g.get('jwt_payload')
+    if request_payload and request_payload[0] == token:
+        return request_payload[1]
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = TOKEN_CACHE.get(token_hash)
+    if payload is None:
+        payload = verify_decode_jwt(token)
+        if 'exp' in payload:
+            TOKEN_CACHE.set(token_hash, payload, ttl=payload['exp'] - time.time())
+    g.jwt_payload = (token, payload)
+    return payload
+
+
 '''
 @TODO implement @requires_auth(permission) decorator method
     @INPUTS
@@ -106,8 +144,7 @@ def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
+            payload = get_token_payload()
             if permission:
                 check_permissions(permission, payload)
             return f(payload, *args, **kwargs)
@@ -117,16 +154,20 @@ def requires_auth(permission=''):
 
 def get_logged_user():
     try:
-        token = get_token_auth_header()
-        payload = verify_decode_jwt(token)
+        payload = get_token_payload()
         oauth_id = payload['sub']
-        # TODO: search user. If not found add it to DB
-        user = User.query.filter(User.oauth_accounts.any(UserAccount.oauth_id == oauth_id)).first()
+        logged_user = g.get('logged_user')
+        if logged_user and logged_user[0] == oauth_id:
+            return logged_user[1]
+        user = None
+        user_id = USER_ID_CACHE.get(oauth_id)
+        if user_id is not None:
+            user = User.query.get(user_id)
         if not user:
-            user = User(name=oauth_id)
-            user.insert()
-            user_account = UserAccount(user_id=user.id, oauth_id=oauth_id)
-            user_account.insert()
+            # First login (or stale cache entry): search user and add it to DB if not found
+            user = User.get_or_create_by_oauth_id(oauth_id)
+            USER_ID_CACHE.set(oauth_id, user.id)
+        g.logged_user = (oauth_id, user)
         return user
     except AuthError as ex:
         print(ex)
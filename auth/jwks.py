@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+def urlopen_fetcher(url, timeout=5):
+    """
+    urlopen_fetcher(url)
+        returns a fetcher downloading and decoding the JWKS document published at url
+    """
+    def fetch():
+        return json.loads(urlopen(url, timeout=timeout).read())
+    return fetch
+
+
+class JWKSCache:
+    """
+    Process-local cache of a JSON Web Key Set.
+
+    Keys are served from memory for `ttl` seconds. Once expired they are still served for up to `stale_ttl` more
+    seconds while a background thread refreshes them, so requests never wait on the IdP unless the cache is empty
+    or too old. Concurrent refreshes are collapsed into a single fetch. A token signed with a key id missing from the
+    cached set (i.e. the IdP rotated its keys) triggers a refetch, at most once every `min_refetch_interval` seconds.
+    """
+
+    def __init__(self, fetcher, ttl=3600, stale_ttl=86400, min_refetch_interval=30, fetch_timeout=10,
+                 clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.fetch_timeout = fetch_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._keys = None
+        self._fetched_at = None
+        self._last_attempt = None
+        self._last_error = None
+        self._inflight = None  # Event of the fetch currently running, if any
+
+    def get(self, kid=None):
+        """
+        get(kid)
+            return the cached key set, fetching it when missing, too old or not containing the key id kid
+        """
+        keys = self._keys
+        if keys is None:
+            return self._fetch()
+        age = self.clock() - self._fetched_at
+        if age >= self.ttl + self.stale_ttl:
+            return self._fetch()
+        if age >= self.ttl:
+            self.refresh_async()
+        if kid and not self._has_kid(keys, kid) and self._can_refetch():
+            keys = self._fetch()
+        return keys
+
+    def refresh_async(self):
+        """
+        refresh_async()
+            refresh the key set in a background thread, unless a fetch is already running
+        """
+        if self._inflight is not None:
+            return
+        thread = threading.Thread(target=self._fetch_quietly, name='jwks-refresh', daemon=True)
+        thread.start()
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._fetched_at = None
+            self._last_attempt = None
+            self._last_error = None
+
+    def _fetch_quietly(self):
+        try:
+            self._fetch()
+        except Exception:
+            pass  # Keep serving the stale keys, next request will retry
+
+    def _fetch(self):
+        # Single-flight: the first caller fetches, the others wait for its result
+        with self._lock:
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = threading.Event()
+        if leader:
+            try:
+                keys = self.fetcher()
+                self._keys = keys
+                self._fetched_at = self.clock()
+                self._last_error = None
+            except Exception as ex:
+                self._last_error = ex
+            finally:
+                self._last_attempt = self.clock()
+                with self._lock:
+                    self._inflight = None
+                event.set()
+        else:
+            event.wait(self.fetch_timeout)
+        if self._keys is None:
+            raise self._last_error or RuntimeError('JWKS fetch did not complete')
+        if self._last_error is not None and self.clock() - self._fetched_at >= self.ttl + self.stale_ttl:
+            raise self._last_error
+        return self._keys
+
+    def _can_refetch(self):
+        return self._last_attempt is None or self.clock() - self._last_attempt >= self.min_refetch_interval
+
+    @staticmethod
+    def _has_kid(keys, kid):
+        return any(key.get('kid') == kid for key in keys.get('keys', []))
@@ -0,0 +1,111 @@
+"""
+Compare JSON serialization of 50 items GET /matches pages: the Flask 1.0 stock jsonify (stdlib encoder, datetimes
+through the default hook) against the app JSON providers (see json_provider.py).
+
+    python benchmarks/bench_json.py [--matches 500] [--requests 300]
+
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(), 'bench.sqlite')))
+os.environ.setdefault('AUTH0_DOMAIN', 'bench.invalid')
+os.environ.setdefault('AUTH0_API_AUDIENCE', 'bench')
+os.environ.setdefault('JWT_ALGORITHMS', 'RS256')
+
+import flask  # noqa: E402
+from flask import json as flask_json  # noqa: E402
+import json_provider  # noqa: E402
+import projections  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Game, User, Match, MatchParticipants  # noqa: E402
+
+
+class FlaskJSONProvider:
+    """
+    FlaskJSONProvider
+        the serialization before the JSON provider: stock flask.jsonify with the stock Flask encoder
+    """
+
+    def response(self, *args, **kwargs):
+        return flask.jsonify(*args, **kwargs)
+
+
+def seed(n_matches):
+    game = Game(name='Bench game')
+    users = [User(name='bench user {}'.format(i)) for i in range(4)]
+    db.session.add(game)
+    db.session.add_all(users)
+    db.session.flush()
+    now = datetime.now()
+    for i in range(n_matches):
+        match = Match(name='Bench match {}'.format(i), uuid='bench-{}'.format(i), game_id=game.id,
+                      creator_id=users[0].id, max_participants=4, participant_count=2,
+                      created_at=now - timedelta(minutes=i), updated_at=now)
+        db.session.add(match)
+        db.session.flush()
+        db.session.add_all([MatchParticipants(match_id=match.id, user_id=user.id) for user in users[:2]])
+    db.session.commit()
+
+
+def bench(name, fn, n):
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print('{:<32} {:>10.1f} /s {:>10.3f} ms'.format(name, n / elapsed, elapsed / n * 1000))
+
+
+def use_provider(provider):
+    if isinstance(provider, FlaskJSONProvider):
+        app.json_encoder = flask_json.JSONEncoder
+    else:
+        app.json_encoder = json_provider.JSONEncoder
+    app.extensions['json_provider'] = provider
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if not Match.query.filter(Match.uuid.like('bench-%')).first():
+            seed(args.matches)
+
+    providers = [('flask.jsonify (before)', FlaskJSONProvider()),
+                 ('stdlib provider', json_provider.make_provider(app, 'stdlib'))]
+    if json_provider.orjson is not None:
+        providers.append(('orjson provider', json_provider.make_provider(app, 'orjson')))
+    else:
+        print('orjson is not installed, skipping orjson provider')
+
+    client = app.test_client()
+    with app.test_request_context():
+        # A page as the view builds it, datetimes included (a decoded response would only hold strings)
+        rows = projections.match_short_query(participants=True).order_by(Match.created_at.desc(), Match.id.desc()) \
+            .limit(50).all()
+        payload = {'matches': projections.match_shorts(rows, participants=True), 'next_cursor': None}
+    print('Serialization only, {} matches per page'.format(len(payload['matches'])))
+    for name, provider in providers:
+        use_provider(provider)
+        with app.test_request_context():
+            bench(name, lambda: provider.response(payload).get_data(), args.requests * 10)
+
+    print('GET /matches?perPage=50')
+    for name, provider in providers:
+        use_provider(provider)
+        bench(name, lambda: client.get('/matches?perPage=50').get_data(), args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+"""
+Benchmark harness of the API endpoints.
+
+Seeds a database with configurable volumes, drives the app through the Flask test client (default) or a local WSGI
+server (--server), with JWT signed by a throwaway key served as JWKS, and reports latency percentiles, throughput and
+SQL query count (read from the Server-Timing header, see profiler.py) per endpoint.
+
+    python benchmarks/harness.py                                  # Small dataset, every scenario
+    python benchmarks/harness.py --only matches --requests 500    # Scenarios whose name contains 'matches'
+    python benchmarks/harness.py --preset search-1m               # Search scenarios on 1M matches
+    python benchmarks/harness.py --only matchmaking --server --concurrency 16   # Concurrent matchmaking
+    python benchmarks/harness.py --output base.json               # Save results...
+    python benchmarks/harness.py --baseline base.json             # ...and fail on regressions against them
+
+Uses a throwaway SQLite database unless --database-url (or DATABASE_URL) is set. An existing database is seeded
+only if empty, unless --reseed is passed (which drops every table first).
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import base64
+import argparse
+import tempfile
+import threading
+import http.client
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PRESETS = {
+    'small': {'games': 50, 'users': 500, 'matches': 2000, 'participants': 2, 'tournaments': 100},
+    'medium': {'games': 1000, 'users': 20000, 'matches': 100000, 'participants': 3, 'tournaments': 5000},
+    'search-1m': {'games': 10000, 'users': 100000, 'matches': 1000000, 'participants': 2, 'tournaments': 10000,
+                  'only': 'search'},
+}
+
+WORDS = ['alpha', 'bravo', 'chess', 'delta', 'eagle', 'forest', 'galaxy', 'harbor', 'island', 'jungle', 'knight',
+         'legend', 'meteor', 'nebula', 'orbit', 'pirate', 'quest', 'rocket', 'shadow', 'titan', 'unicorn', 'vortex',
+         'wizard', 'xenon', 'yonder', 'zephyr']
+
+CHUNK_SIZE = 10000
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    for volume in ('games', 'users', 'matches', 'participants', 'tournaments'):
+        parser.add_argument('--{}'.format(volume), type=int, help='override preset volume')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--reseed', action='store_true', help='drop every table and seed again')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--server', action='store_true', help='run a local WSGI server instead of the test client')
+    parser.add_argument('--only', help='run only scenarios whose name contains this')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare results with this JSON file, exit 1 on regressions')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed p95 latency increase against the baseline (ratio)')
+    args = parser.parse_args()
+    volumes = dict(PRESETS[args.preset])
+    for volume in ('games', 'users', 'matches', 'participants', 'tournaments'):
+        if getattr(args, volume) is not None:
+            volumes[volume] = getattr(args, volume)
+    preset_only = volumes.pop('only', None)
+    args.only = args.only or preset_only
+    args.volumes = volumes
+    return args
+
+
+class FakeAuth:
+    """
+    FakeAuth
+        RSA key signing benchmark JWT, and the JWKS document publishing it
+    """
+
+    def __init__(self, audience):
+        from Crypto.PublicKey import RSA
+        key = RSA.generate(2048)
+        self.audience = audience
+        self.pem = key.exportKey().decode()
+        self.jwks = {'keys': [{'kty': 'RSA', 'kid': 'bench', 'use': 'sig', 'alg': 'RS256',
+                               'n': self._b64(key.n), 'e': self._b64(key.e)}]}
+        self._tokens = {}
+
+    @staticmethod
+    def _b64(number):
+        data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+    def headers(self, sub, permissions=()):
+        key = (sub, tuple(permissions))
+        if key not in self._tokens:
+            from jose import jwt
+            claims = {'sub': sub, 'aud': self.audience, 'permissions': list(permissions),
+                      'exp': int(time.time()) + 24 * 3600}
+            token = jwt.encode(claims, self.pem, algorithm='RS256', headers={'kid': 'bench'})
+            self._tokens[key] = {'Authorization': 'Bearer {}'.format(token)}
+        return self._tokens[key]
+
+
+def setup_environment(args):
+    if not args.database_url:
+        args.database_url = 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(), 'bench.sqlite'))
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('AUTH0_DOMAIN', 'bench.invalid')
+    os.environ.setdefault('AUTH0_API_AUDIENCE', 'bench')
+    os.environ.setdefault('JWT_ALGORITHMS', 'RS256')
+    fake_auth = FakeAuth(os.environ['AUTH0_API_AUDIENCE'])
+    # Serve the benchmark key before the app warms up its JWKS cache
+    import auth
+    auth.JWKS.fetcher = lambda: fake_auth.jwks
+    auth.JWKS.clear()
+    from app import app
+    return app, fake_auth
+
+
+def insert_chunks(table, rows):
+    from models import db
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+
+
+def seed(volumes, rnd):
+    """
+    seed(volumes, rnd)
+        insert games, users (with their oauth account 'bench|<id>'), matches with participants and tournaments with
+        participants, by bulk inserts
+    """
+    from models import db, Game, User, UserAccount, Match, MatchParticipants, Tournament, TournamentParticipants
+    n_games, n_users, n_matches = volumes['games'], volumes['users'], volumes['matches']
+    n_participants, n_tournaments = volumes['participants'], volumes['tournaments']
+    now = datetime.now()
+
+    def name(i):
+        return '{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), i)
+
+    insert_chunks(Game.__table__, ({'id': i, 'name': name(i)} for i in range(1, n_games + 1)))
+    insert_chunks(User.__table__, ({'id': i, 'name': 'user {}'.format(i)} for i in range(1, n_users + 1)))
+    insert_chunks(UserAccount.__table__, ({'user_id': i, 'oauth_id': 'bench|{}'.format(i)}
+                                          for i in range(1, n_users + 1)))
+    insert_chunks(Tournament.__table__, ({
+        'id': i, 'uuid': 'bench-t{}'.format(i), 'name': name(i), 'creator_id': rnd.randint(1, n_users),
+        'game_id': rnd.randint(1, n_games), 'max_participants': 16, 'participant_count': min(8, n_users),
+        'created_at': now, 'updated_at': now,
+    } for i in range(1, n_tournaments + 1)))
+    insert_chunks(TournamentParticipants.__table__, ({
+        'tournament_id': tournament_id, 'user_id': user_id,
+    } for tournament_id in range(1, n_tournaments + 1)
+        for user_id in rnd.sample(range(1, n_users + 1), min(8, n_users))))
+    insert_chunks(Match.__table__, ({
+        'id': i, 'uuid': 'bench-m{}'.format(i), 'name': name(i), 'creator_id': rnd.randint(1, n_users),
+        'game_id': rnd.randint(1, n_games), 'is_private': rnd.random() < 0.1,
+        'tournament_id': rnd.randint(1, n_tournaments) if n_tournaments and rnd.random() < 0.2 else None,
+        'max_participants': n_participants + 2, 'participant_count': n_participants,
+        'created_at': now - timedelta(seconds=i), 'updated_at': now,
+    } for i in range(1, n_matches + 1)))
+    insert_chunks(MatchParticipants.__table__, ({
+        'match_id': match_id, 'user_id': user_id,
+    } for match_id in range(1, n_matches + 1)
+        for user_id in rnd.sample(range(1, n_users + 1), min(n_participants, n_users))))
+    db.session.commit()
+
+
+def prepare_database(app, args, rnd):
+    from models import db, Game
+    with app.app_context():
+        if args.reseed:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Game.id).first() is None:
+            print('Seeding {}...'.format(', '.join('{} {}'.format(v, k) for k, v in args.volumes.items())))
+            start = time.perf_counter()
+            seed(args.volumes, rnd)
+            print('Seeded in {:.1f}s'.format(time.perf_counter() - start))
+        else:
+            print('Database already seeded, reusing it (pass --reseed to seed it again)')
+        volumes = {
+            'games': db.session.execute('SELECT MAX(id) FROM games').scalar() or 0,
+            'users': db.session.execute('SELECT MAX(user_id) FROM user_accounts WHERE oauth_id LIKE \'bench|%\'')
+            .scalar() or 0,
+            'matches': db.session.execute('SELECT MAX(id) FROM matches').scalar() or 0,
+            'tournaments': db.session.execute('SELECT MAX(id) FROM tournaments').scalar() or 0,
+        }
+    return volumes
+
+
+def scenarios(volumes, fake_auth, rnd):
+    """
+    scenarios(volumes, fake_auth, rnd)
+        benchmark scenarios: name -> (request(i) returning (method, url, headers, json body), accepted statuses)
+    """
+    n_games, n_users = max(volumes['games'], 1), max(volumes['users'], 1)
+    n_matches, n_tournaments = max(volumes['matches'], 1), max(volumes['tournaments'], 1)
+
+    def user_headers(i, permissions=()):
+        return fake_auth.headers('bench|{}'.format(i % n_users + 1), permissions)
+
+    def get(url, headers=None):
+        return lambda i: ('GET', url(i) if callable(url) else url, headers(i) if headers else {}, None)
+
+    def join_leave(i):
+        # Consecutive requests join and leave the same match as the same user
+        pair = i // 2
+        action = 'join' if i % 2 == 0 else 'disjoin'
+        return 'PATCH', '/matches/{}'.format(pair % n_matches + 1), user_headers(pair), {'action': action}
+
+    def tournament_join_leave(i):
+        pair = i // 2
+        action = 'join' if i % 2 == 0 else 'leave'
+        url = '/tournaments/bench-t{}/{}'.format(pair % n_tournaments + 1, action)
+        return 'POST', url, user_headers(pair), None
+
+    def matchmaking(i):
+        # Every request is a different user queueing on a handful of games, so concurrent requests contend for the
+        # same lobbies
+        body = {'gameId': i % min(n_games, 5) + 1, 'maxParticipants': 2}
+        return 'POST', '/matches/matchmaking', user_headers(i), body
+
+    def create_match(i):
+        body = {'gameId': rnd.randint(1, n_games), 'name': 'bench match {}'.format(i), 'maxParticipants': 4}
+        return 'POST', '/matches', user_headers(i, ['create:match']), body
+
+    def create_tournament(i):
+        body = {'gameId': rnd.randint(1, n_games), 'name': 'bench tournament {}'.format(i), 'maxParticipants': 8}
+        return 'POST', '/tournaments', user_headers(i, ['create:tournament']), body
+
+    ok = (200, 201, 204, 304)
+    return {
+        'games.list': (get('/games'), ok),
+        'games.search': (get(lambda i: '/games?searchTerm={}'.format(rnd.choice(WORDS))), ok),
+        'games.detail': (get(lambda i: '/games/{}'.format(rnd.randint(1, n_games))), ok),
+        'matches.list': (get('/matches?perPage=50'), ok),
+        'matches.list_cursor': (get('/matches?cursor=&perPage=50'), ok),
+        'matches.list_logged': (get('/matches?perPage=50', user_headers), ok),
+        'matches.search': (get(lambda i: '/matches?perPage=50&searchTerm={}'.format(rnd.choice(WORDS))), ok),
+        'matches.detail': (get(lambda i: '/matches/bench-m{}'.format(rnd.randint(1, n_matches))), ok),
+        'matches.users': (get(lambda i: '/matches/{}/users'.format(rnd.randint(1, n_matches))), ok),
+        'matches.users_search': (get(lambda i: '/matches/{}/users?joined=0&searchTerm=user%201'.format(
+            rnd.randint(1, n_matches))), ok),
+        'matches.join_leave': (join_leave, ok + (400,)),  # Replays can find the match full or already joined
+        'matches.create': (create_match, ok),
+        'matches.matchmaking': (matchmaking, ok),
+        'tournaments.list': (get('/tournaments'), ok),
+        'tournaments.search': (get(lambda i: '/tournaments?searchTerm={}'.format(rnd.choice(WORDS))), ok),
+        'tournaments.detail': (get(lambda i: '/tournaments/bench-t{}'.format(rnd.randint(1, n_tournaments))), ok),
+        'tournaments.join_leave': (tournament_join_leave, ok + (400,)),
+        'tournaments.create': (create_tournament, ok),
+    }
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, url, headers, body):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        response = self.local.client.open(url, method=method, headers=headers, json=body)
+        response.get_data()
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+    def close(self):
+        pass
+
+
+class WSGIServerTransport:
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def request(self, method, url, headers, body):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = dict(headers)
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.local.connection.request(method, url, body=data, headers=headers)
+        response = self.local.connection.getresponse()
+        response.read()
+        if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+            self.local.connection.close()
+            del self.local.connection
+        return response.status, ', '.join(value for key, value in response.getheaders() if key == 'Server-Timing')
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]  # Nearest rank
+
+
+def run_scenario(transport, request, accepted, n_requests, concurrency):
+    latencies, queries, errors = [], [], []
+
+    # Build requests (and sign their tokens) before timing
+    requests = [request(i) for i in range(n_requests)]
+
+    def run(args):
+        method, url, headers, body = args
+        start = time.perf_counter()
+        status, server_timing = transport.request(method, url, headers, body)
+        elapsed = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(server_timing)
+        return elapsed, int(match.group(1)) if match else None, None if status in accepted else status
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(run, requests))
+    else:
+        results = [run(args) for args in requests]
+    elapsed = time.perf_counter() - start
+    for latency, query_count, error in results:
+        latencies.append(latency)
+        if query_count is not None:
+            queries.append(query_count)
+        if error is not None:
+            errors.append(error)
+    return {
+        'requests': n_requests,
+        'throughput': n_requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_avg': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+    }
+
+
+def print_results(results):
+    print('{:<24} {:>8} {:>10} {:>9} {:>9} {:>9} {:>8} {:>7} {:>7}'.format(
+        'scenario', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'max q', 'errors'))
+    for name, result in results.items():
+        print('{:<24} {:>8} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>7} {:>7}'.format(
+            name, result['requests'], result['throughput'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            '-' if result['queries_avg'] is None else '{:.1f}'.format(result['queries_avg']),
+            '-' if result['queries_max'] is None else result['queries_max'],
+            '{} {}'.format(result['errors'], result['error_statuses']) if result['errors'] else 0))
+
+
+def compare(results, baseline, max_regression):
+    """
+    compare(results, baseline, max_regression)
+        regressions against a previous run: p95 latency grown more than max_regression, more queries per request,
+        or new errors
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append('{}: p95 {:.2f}ms -> {:.2f}ms'.format(name, before['p95_ms'], result['p95_ms']))
+        if (result['queries_max'] or 0) > (before['queries_max'] or 0):
+            regressions.append('{}: max queries {} -> {}'.format(name, before['queries_max'], result['queries_max']))
+        if result['errors'] > before['errors']:
+            regressions.append('{}: errors {} -> {}'.format(name, before['errors'], result['errors']))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    rnd = random.Random(args.seed)
+    app, fake_auth = setup_environment(args)
+    volumes = prepare_database(app, args, rnd)
+    transport = WSGIServerTransport(app) if args.server else TestClientTransport(app)
+    results = {}
+    try:
+        for name, (request, accepted) in scenarios(volumes, fake_auth, rnd).items():
+            if args.only and args.only not in name:
+                continue
+            run_scenario(transport, request, accepted, min(10, args.requests), 1)  # Warm up
+            results[name] = run_scenario(transport, request, accepted, args.requests, args.concurrency)
+    finally:
+        transport.close()
+    print_results(results)
+    settings = {'server': args.server, 'concurrency': args.concurrency, 'requests': args.requests}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'volumes': volumes, 'settings': settings, 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('volumes') != volumes or baseline.get('settings') != settings:
+            print('WARNING baseline was run with different volumes or settings, latencies are not comparable')
+        regressions = compare(results, baseline['results'], args.max_regression)
+        for regression in regressions:
+            print('REGRESSION {}'.format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
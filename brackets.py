@@ -0,0 +1,152 @@
+SINGLE_ELIMINATION = 'single_elimination'
+DOUBLE_ELIMINATION = 'double_elimination'
+ROUND_ROBIN = 'round_robin'
+FORMATS = (SINGLE_ELIMINATION, DOUBLE_ELIMINATION, ROUND_ROBIN)
+
+# Brackets a tournament match belongs to
+WINNERS = 'winners'
+LOSERS = 'losers'
+FINAL = 'final'
+GROUP = 'group'
+
+
+class BracketError(ValueError):
+    pass
+
+
+def bracket_size(format, n_players):
+    """
+    bracket_size(format, n_players)
+        number of bracket slots for n_players: the next power of two for elimination formats (the missing players
+        are byes), n_players for round robin
+    """
+    if format not in FORMATS:
+        raise BracketError('Unknown tournament format: {}'.format(format))
+    if n_players < 2:
+        raise BracketError('A tournament needs at least 2 participants')
+    if format == ROUND_ROBIN:
+        return n_players
+    size = 1 << (n_players - 1).bit_length()
+    if format == DOUBLE_ELIMINATION and (size != n_players or n_players < 4):
+        raise BracketError('Double elimination needs a power of two number of participants (4, 8, 16...)')
+    return size
+
+
+def winners_rounds(size):
+    return size.bit_length() - 1
+
+
+def seed_positions(size):
+    """
+    seed_positions(size)
+        seeds (0 based) in bracket slot order, so top seeds meet as late as possible and byes (seeds beyond the
+        players count) are spread over the first round, i.e. 8 -> [0, 7, 3, 4, 1, 6, 2, 5]
+    """
+    positions = [0]
+    while len(positions) < size:
+        positions = [seed for position in positions for seed in (position, len(positions) * 2 - 1 - position)]
+    return positions
+
+
+def next_slots(format, size, bracket, round, position):
+    """
+    next_slots(format, size, bracket, round, position)
+        where the winner and the loser of a match move: ((bracket, round, position, slot) or None, same for loser).
+        None means the player leaves the bracket (eliminated, or tournament won)
+    """
+    if format == ROUND_ROBIN or bracket == FINAL:
+        return None, None
+    rounds = winners_rounds(size)
+    if bracket == WINNERS:
+        if round < rounds:
+            winner = (WINNERS, round + 1, position // 2, position % 2)
+        else:
+            winner = (FINAL, 1, 0, 0) if format == DOUBLE_ELIMINATION else None
+        if format == SINGLE_ELIMINATION:
+            return winner, None
+        if round == 1:
+            loser = (LOSERS, 1, position // 2, position % 2)
+        else:
+            # Winners bracket losers drop into the even losers rounds, against the losers bracket survivors
+            loser = (LOSERS, 2 * (round - 1), position, 1)
+        return winner, loser
+    # Losers bracket: odd rounds are followed by a round of the same size (facing winners bracket losers), even rounds
+    # by a round of half the size
+    if round == 2 * (rounds - 1):
+        return (FINAL, 1, 0, 1), None
+    if round % 2:
+        return (LOSERS, round + 1, position, 0), None
+    return (LOSERS, round + 1, position // 2, position % 2), None
+
+
+def losers_round_matches(size, round):
+    return size >> (round // 2 + 1 + round % 2)
+
+
+def layout(format, n_players):
+    """
+    layout(format, n_players)
+        matches of a new bracket for n_players (identified by seed, 0 based), as dicts of bracket, round, position,
+        players (seed in each of the 2 slots, None if not known yet) and winner (seed of first round byes, else None).
+        Byes are already advanced to the next round
+    """
+    size = bracket_size(format, n_players)
+    if format == ROUND_ROBIN:
+        return round_robin_layout(n_players)
+    matches = {}
+    rounds = winners_rounds(size)
+    for round in range(1, rounds + 1):
+        for position in range(size >> round):
+            matches[(WINNERS, round, position)] = {'players': [None, None], 'winner': None}
+    if format == DOUBLE_ELIMINATION:
+        for round in range(1, 2 * (rounds - 1) + 1):
+            for position in range(losers_round_matches(size, round)):
+                matches[(LOSERS, round, position)] = {'players': [None, None], 'winner': None}
+        matches[(FINAL, 1, 0)] = {'players': [None, None], 'winner': None}
+    seeds = seed_positions(size)
+    for position in range(size // 2):
+        players = [seed if seed < n_players else None for seed in seeds[position * 2:position * 2 + 2]]
+        match = matches[(WINNERS, 1, position)]
+        match['players'] = players
+        if None in players:
+            # Bye: the lone player goes straight to the second round
+            match['winner'] = players[0] if players[0] is not None else players[1]
+            next_bracket, next_round, next_position, slot = next_slots(format, size, WINNERS, 1, position)[0]
+            matches[(next_bracket, next_round, next_position)]['players'][slot] = match['winner']
+    return [
+        dict(match, bracket=bracket, round=round, position=position)
+        for (bracket, round, position), match in sorted(matches.items(), key=lambda item: layout_order(*item[0]))
+    ]
+
+
+def layout_order(bracket, round, position):
+    return [WINNERS, LOSERS, FINAL, GROUP].index(bracket), round, position
+
+
+def round_robin_layout(n_players):
+    """
+    round_robin_layout(n_players)
+        every player meets every other once, scheduled by the circle method (a player rests each round when odd)
+    """
+    players = list(range(n_players)) + ([None] if n_players % 2 else [])
+    matches = []
+    for round in range(1, len(players)):
+        position = 0
+        for i in range(len(players) // 2):
+            pair = [players[i], players[-1 - i]]
+            if None not in pair:
+                matches.append({'bracket': GROUP, 'round': round, 'position': position, 'players': pair,
+                                'winner': None})
+                position += 1
+        players = [players[0], players[-1]] + players[1:-1]  # Rotate all but the first player
+    return matches
+
+
+def loser_eliminated(format, bracket):
+    """
+    loser_eliminated(format, bracket)
+        whether losing a match of bracket eliminates the player
+    """
+    if format == ROUND_ROBIN:
+        return False
+    return format == SINGLE_ELIMINATION or bracket != WINNERS
@@ -0,0 +1,146 @@
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Shared cache backend is optional
+    redis = None
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    LRUCache(maxsize)
+        thread-safe in-process LRU cache, entries can optionally expire after a ttl (in seconds)
+    """
+
+    def __init__(self, maxsize=1024, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= self.clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    RedisCache(url, namespace)
+        cache shared between processes through Redis, values are stored JSON encoded.
+        Redis failures are treated as cache misses
+    """
+
+    def __init__(self, url, namespace=''):
+        if redis is None:
+            raise RuntimeError('redis package is required to use a shared cache')
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def _key(self, key):
+        return '{}:{}'.format(self.namespace, key)
+
+    def get(self, key, default=None):
+        try:
+            value = self.client.get(self._key(key))
+        except redis.RedisError:
+            return default
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+        except redis.RedisError:
+            pass
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except redis.RedisError:
+            pass
+
+    def clear(self):
+        try:
+            for key in self.client.scan_iter(self._key('*')):
+                self.client.delete(key)
+        except redis.RedisError:
+            pass
+
+
+class TieredCache:
+    """
+    TieredCache(local, shared, local_ttl)
+        read through a local cache first, then through the shared one, copying shared hits locally for local_ttl
+        seconds (bounding how long an entry deleted by another process can still be served locally)
+    """
+
+    def __init__(self, local, shared, local_ttl=None):
+        self.local = local
+        self.shared = shared
+        self.local_ttl = local_ttl
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.shared.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self.local.set(key, value, ttl=self.local_ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.shared.set(key, value, ttl=ttl)
+        local_ttl = self.local_ttl if ttl is None else min(ttl, self.local_ttl or ttl)
+        self.local.set(key, value, ttl=local_ttl)
+
+    def delete(self, key):
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+
+
+def make_cache(namespace, maxsize=1024, local_ttl=None):
+    """
+    make_cache(namespace)
+        return an in-process LRU cache, tiered in front of Redis when CACHE_REDIS_URL is set
+    """
+    local = LRUCache(maxsize)
+    redis_url = os.environ.get('CACHE_REDIS_URL')
+    if redis_url:
+        return TieredCache(local, RedisCache(redis_url, namespace), local_ttl=local_ttl)
+    return local
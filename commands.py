@@ -0,0 +1,74 @@
+import sys
+import click
+from datetime import datetime
+from flask.cli import with_appcontext
+from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint, func
+from models import db, Match, Tournament
+
+
+@click.command('recount-participants')
+@click.option('--check', is_flag=True, help='Only report wrong counters, failing if there are any.')
+@with_appcontext
+def recount_participants_command(check):
+    """Recompute (backfill) participant counters from participants rows."""
+    wrong = 0
+    for name, model in (('matches', Match), ('tournaments', Tournament)):
+        updated = model.recount_participants(fix=not check)
+        wrong += updated
+        click.echo('{} participant_count of {} {}'.format('Wrong' if check else 'Fixed', updated, name))
+    if check and wrong:
+        sys.exit(1)
+
+
+@click.command('backfill-timestamps')
+@with_appcontext
+def backfill_timestamps_command():
+    """Set created_at/updated_at of tournaments created before the columns existed."""
+    tournaments = Tournament.__table__
+    now = datetime.now()
+    updated = db.session.execute(
+        tournaments.update()
+        .where((tournaments.c.created_at == None) | (tournaments.c.updated_at == None))
+        .values(created_at=func.coalesce(tournaments.c.created_at, now),
+                updated_at=func.coalesce(tournaments.c.updated_at, tournaments.c.created_at, now))
+    ).rowcount
+    db.session.commit()
+    click.echo('Backfilled timestamps of {} tournaments'.format(updated))
+
+
+def unindexed_foreign_keys(metadata):
+    """
+    unindexed_foreign_keys(metadata)
+        return 'table(columns)' of every foreign key whose columns are not the leading columns of an index, a unique
+        constraint or the primary key of its table
+    """
+    missing = []
+    for table in metadata.sorted_tables:
+        indexed = [[column.name for column in index.columns] for index in table.indexes]
+        indexed += [
+            [column.name for column in constraint.columns] for constraint in table.constraints
+            if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint))
+        ]
+        for foreign_key in table.foreign_key_constraints:
+            columns = [column.name for column in foreign_key.columns]
+            if not any(index_columns[:len(columns)] == columns for index_columns in indexed):
+                missing.append('{}({})'.format(table.name, ', '.join(columns)))
+    return missing
+
+
+@click.command('check-fk-indexes')
+@with_appcontext
+def check_fk_indexes_command():
+    """Fail if a foreign key of the models is not indexed."""
+    missing = unindexed_foreign_keys(db.metadata)
+    for foreign_key in missing:
+        click.echo('Foreign key without index: {}'.format(foreign_key), err=True)
+    if missing:
+        sys.exit(1)
+    click.echo('All foreign keys are indexed')
+
+
+def register_commands(app):
+    app.cli.add_command(recount_participants_command)
+    app.cli.add_command(check_fk_indexes_command)
+    app.cli.add_command(backfill_timestamps_command)
@@ -0,0 +1,60 @@
+import time
+import threading
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    InstrumentedQueuePool
+        QueuePool recording how many checkouts had to wait for a connection and for how long
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            wait_time = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+def pool_status(engine):
+    """
+    pool_status(engine)
+        return size, usage and wait time metrics of the engine connection pool
+    """
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update({
+            'checkouts': pool.checkouts,
+            'timeouts': pool.timeouts,
+            'wait_time_total': round(pool.wait_time_total, 6),
+            'wait_time_avg': round(pool.wait_time_total / pool.checkouts, 6) if pool.checkouts else 0,
+            'wait_time_max': round(pool.wait_time_max, 6),
+        })
+    return status
@@ -0,0 +1,93 @@
+import os
+import random
+import hashlib
+from flask import g, request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm, event
+from sqlalchemy.sql.dml import UpdateBase
+from cache import make_cache
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Clients that recently wrote, whose reads stay on the primary until replicas catch up (read-your-writes)
+STICKY_CLIENTS = make_cache('db-sticky', maxsize=int(os.environ.get('DB_STICKY_CACHE_SIZE', 4096)))
+
+
+def use_replica(f):
+    """
+    use_replica(f)
+        mark a view as read-only, so its GET requests read from a replica database (when configured)
+    """
+    f.use_replica = True
+    return f
+
+
+def replica_binds(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_BIND_PREFIX))
+
+
+class RoutingSession(SignallingSession):
+    """
+    RoutingSession
+        session reading from a replica during requests routed to replicas (see use_replica), and using the primary
+        for everything else. Once the session writes (flush, INSERT/UPDATE/DELETE, SELECT FOR UPDATE) every
+        following statement goes to the primary too
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None) is not None:
+            self.info['writing'] = True
+        if not self.info.get('writing') and has_request_context() and g.get('db_replica'):
+            if 'replica' not in self.info:
+                # Stick to one replica for the whole session, so a request reads a consistent snapshot
+                self.info['replica'] = random.choice(replica_binds(self.app))
+            return get_state(self.app).db.get_engine(self.app, bind=self.info['replica'])
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        session_factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(session_factory, 'before_flush', mark_session_writing)
+        event.listen(session_factory, 'after_commit', stick_client_to_primary)
+        return session_factory
+
+
+def mark_session_writing(session, flush_context, instances):
+    session.info['writing'] = True
+
+
+def stick_client_to_primary(session):
+    if session.info.pop('writing', False) and has_request_context():
+        # The rest of the request reads from the primary too: replicas may not have the commit yet
+        g.db_replica = False
+        client = client_key()
+        if client:
+            STICKY_CLIENTS.set(client, True, ttl=session.app.config['DB_REPLICA_STICKY_SECONDS'])
+
+
+def client_key():
+    auth_header = request.headers.get('Authorization')
+    return hashlib.sha256(auth_header.encode()).hexdigest() if auth_header else None
+
+
+def init_app(app, replica_paths):
+    """
+    init_app(app, replica_paths)
+        configure replica databases as SQLAlchemy binds and route GET requests of use_replica views to them, unless
+        the client wrote in the last DB_REPLICA_STICKY_SECONDS seconds
+    """
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, replica_path in enumerate(replica_paths):
+        binds['{}{}'.format(REPLICA_BIND_PREFIX, i)] = replica_path
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config.setdefault('DB_REPLICA_STICKY_SECONDS', int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)))
+
+    @app.before_request
+    def route_to_replica():
+        if not replica_paths or request.method not in ('GET', 'HEAD'):
+            return
+        view = app.view_functions.get(request.endpoint)
+        if getattr(view, 'use_replica', False):
+            client = client_key()
+            g.db_replica = not (client and STICKY_CLIENTS.get(client))
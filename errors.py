@@ -1,8 +1,11 @@
-from flask import jsonify
-from werkzeug.exceptions import NotFound
+from flask import current_app
+from werkzeug.exceptions import NotFound, BadRequest, HTTPException
+from json_provider import jsonify
 
 
 def bad_request_error(error='Bad request'):
+    if isinstance(error, BadRequest):
+        return jsonify({'success': False, 'error': 400, 'message': error.description}), 400
     return jsonify({'success': False, 'error': 400, 'message': error}), 400
 
 
@@ -24,5 +27,16 @@ def not_found_error(error='Resource not found'):
     return jsonify({'success': False, 'error': 404, 'message': error}), 404
 
 
+def auth_error(error):
+    return jsonify({'success': False, 'error': error.status_code, 'message': error.error}), error.status_code
+
+
 def server_error(error='Server Error'):
+    if isinstance(error, HTTPException):
+        return jsonify({'success': False, 'error': 500, 'message': error.description}), 500
+    if isinstance(error, Exception):
+        # Flask 1.0 passes unhandled exceptions as they are, not wrapped in InternalServerError. Their text (i.e.
+        # SQL and parameters of database errors) is only logged
+        current_app.logger.exception('Unhandled exception: %r', error)
+        return jsonify({'success': False, 'error': 500, 'message': 'Server Error'}), 500
     return jsonify({'success': False, 'error': 500, 'message': error}), 500
@@ -0,0 +1,90 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, current_app
+
+
+def entry_response(entry):
+    """
+    entry_response(entry)
+        response for a cached {'body', 'etag'} entry, an empty 304 if the client sent a matching If-None-Match
+    """
+    if request.if_none_match.contains_weak(entry['etag']):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(entry['body'], mimetype=current_app.config['JSONIFY_MIMETYPE'])
+    response.set_etag(entry['etag'])
+    return response
+
+
+def version_etag(id, updated_at):
+    """
+    version_etag(id, updated_at)
+        ETag of a row version, changing whenever its updated_at does
+    """
+    return '{}-{}'.format(id, updated_at.timestamp() if updated_at else 0)
+
+
+def versioned_response(etag, last_modified, build):
+    """
+    versioned_response(etag, last_modified, build)
+        response of a resource whose version is known before loading it: an empty 304 if the client already has
+        etag (or a copy not older than last_modified), otherwise the response returned by build()
+    """
+    last_modified = last_modified.replace(microsecond=0) if last_modified else None
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        if_modified_since = request.if_modified_since
+        not_modified = bool(
+            last_modified and if_modified_since and last_modified <= if_modified_since.replace(tzinfo=None)
+        )
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(build())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def init_app(app):
+    """
+    init_app(app)
+        add the Cache-Control header configured for each endpoint in CACHE_CONTROL config
+        (endpoint -> header value) to its successful GET responses
+    """
+    app.config.setdefault('CACHE_CONTROL', {})
+
+    @app.after_request
+    def set_cache_control(response):
+        policy = app.config['CACHE_CONTROL'].get(request.endpoint)
+        if policy and request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            response.headers.setdefault('Cache-Control', policy)
+        return response
+
+
+def cached_json_view(cache, ttl=None):
+    """
+    cached_json_view(cache, ttl)
+        decorator storing successful JSON responses of a view in cache for ttl seconds, keyed by request path and
+        args. Cached responses are served without calling the view, and conditional requests are answered with 304.
+        The ttl bounds how long a stale entry can be served when an invalidation is missed (i.e. by other processes
+        of an in-process cache)
+    """
+    def cached_json_view_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = '{}?{}'.format(request.path, urlencode(sorted(request.args.items(multi=True))))
+            entry = cache.get(key)
+            if entry is None:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data(as_text=True)
+                entry = {'body': body, 'etag': hashlib.sha1(body.encode()).hexdigest()}
+                cache.set(key, entry, ttl=ttl)
+            return entry_response(entry)
+        return wrapper
+    return cached_json_view_decorator
@@ -0,0 +1,91 @@
+import os
+import json
+from datetime import date, time
+from flask import current_app, json as flask_json
+
+try:
+    import orjson
+except ImportError:  # Optional fast encoder, the stdlib one is used without it
+    orjson = None
+
+
+class JSONEncoder(flask_json.JSONEncoder):
+    """
+    JSONEncoder
+        Flask encoder writing dates and datetimes in ISO-8601 (instead of HTTP dates)
+    """
+
+    def default(self, o):
+        if isinstance(o, (date, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class StdlibJSONProvider:
+    """
+    StdlibJSONProvider(app)
+        JSON provider using the app json_encoder
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def dumps(self, obj, pretty=False):
+        if pretty:
+            return json.dumps(obj, cls=self.app.json_encoder, indent=2, separators=(', ', ': '))
+        return json.dumps(obj, cls=self.app.json_encoder, separators=(',', ':'))
+
+    def response(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+        data = args[0] if len(args) == 1 else (args or kwargs)
+        pretty = self.app.config['JSONIFY_PRETTYPRINT_REGULAR'] or self.app.debug
+        return self.app.response_class(
+            self.dumps(data, pretty) + '\n', mimetype=self.app.config['JSONIFY_MIMETYPE']
+        )
+
+
+class OrjsonJSONProvider(StdlibJSONProvider):
+    """
+    OrjsonJSONProvider(app)
+        JSON provider using orjson, which serializes datetimes natively. Other unsupported types go through the app
+        json_encoder
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, pretty=False):
+        options = self.options | orjson.OPT_INDENT_2 if pretty else self.options
+        return orjson.dumps(obj, default=self.app.json_encoder().default, option=options).decode()
+
+
+def make_provider(app, name):
+    """
+    make_provider(app, name)
+        JSON provider by name: orjson, stdlib, or auto (orjson when installed)
+    """
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson':
+        if orjson is None:
+            raise RuntimeError('orjson package is required to use orjson JSON provider')
+        return OrjsonJSONProvider(app)
+    if name == 'stdlib':
+        return StdlibJSONProvider(app)
+    raise ValueError('Unsupported JSON provider: {}'.format(name))
+
+
+def init_app(app):
+    app.config.setdefault('JSON_PROVIDER', os.environ.get('JSON_PROVIDER', 'auto'))
+    app.json_encoder = JSONEncoder
+    app.extensions['json_provider'] = make_provider(app, app.config['JSON_PROVIDER'])
+
+
+def jsonify(*args, **kwargs):
+    """
+    jsonify(*args, **kwargs)
+        drop-in replacement of flask.jsonify serializing through the app JSON provider
+    """
+    return current_app.extensions['json_provider'].response(*args, **kwargs)
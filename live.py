@@ -0,0 +1,187 @@
+import os
+import json
+import queue
+import select
+import logging
+import threading
+from collections import defaultdict
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # Only needed by RedisBroker
+    redis = None
+
+logger = logging.getLogger('live')
+
+
+class MemoryBroker:
+    """
+    MemoryBroker
+        in-process broker, subscribers only get events published by the same process (tests, single worker setups)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers[channel])
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def subscribe(self, channel):
+        return MemorySubscription(self, channel)
+
+
+class MemorySubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue()
+        with broker._lock:
+            broker._subscribers[channel].add(self.queue)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker._lock:
+            self.broker._subscribers[self.channel].discard(self.queue)
+            if not self.broker._subscribers[self.channel]:
+                del self.broker._subscribers[self.channel]
+
+
+class RedisBroker:
+    """
+    RedisBroker(url)
+        broker shared by every worker through Redis pub/sub
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('redis package is required to use Redis live broker')
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, event):
+        self.client.publish('live:{}'.format(channel), json.dumps(event))
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.client, 'live:{}'.format(channel))
+
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class PostgresBroker:
+    """
+    PostgresBroker(url)
+        broker shared by every worker through PostgreSQL LISTEN/NOTIFY. Each subscription holds its own connection,
+        outside the SQLAlchemy pool
+    """
+
+    def __init__(self, url):
+        import psycopg2
+        self.connect = lambda: psycopg2.connect(url)
+        self._publish_connection = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            if self._publish_connection is None or self._publish_connection.closed:
+                self._publish_connection = self.connect()
+                self._publish_connection.autocommit = True
+            with self._publish_connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', (channel, json.dumps(event)))
+
+    def subscribe(self, channel):
+        return PostgresSubscription(self.connect(), channel)
+
+
+class PostgresSubscription:
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute('LISTEN "{}"'.format(channel.replace('"', '')))
+
+    def get(self, timeout):
+        if not self.connection.notifies:
+            if select.select([self.connection], [], [], timeout) == ([], [], []):
+                return None
+            self.connection.poll()
+        if not self.connection.notifies:
+            return None
+        return json.loads(self.connection.notifies.pop(0).payload)
+
+    def close(self):
+        self.connection.close()
+
+
+def make_broker(url):
+    """
+    make_broker(url)
+        broker for url: memory:// (default), redis://... or postgresql://...
+    """
+    if not url or url.startswith('memory'):
+        return MemoryBroker()
+    if url.startswith('redis'):
+        return RedisBroker(url)
+    if url.startswith('postgres'):
+        return PostgresBroker(url)
+    raise ValueError('Unsupported live broker URL: {}'.format(url))
+
+
+def init_app(app):
+    app.config.setdefault('LIVE_BROKER_URL', os.environ.get('LIVE_BROKER_URL', 'memory://'))
+    app.config.setdefault('LIVE_KEEPALIVE_SECONDS', 15)
+    app.extensions['live_broker'] = make_broker(app.config['LIVE_BROKER_URL'])
+
+
+def match_channel(match_id):
+    return 'match_{}'.format(match_id)
+
+
+def publish_match_event(match_id, event_type, **data):
+    """
+    publish_match_event(match_id, event_type, **data)
+        publish an event to the match live channel. Call it after committing: a broker failure is logged and never
+        fails the write that triggered it
+    """
+    event = dict(data, type=event_type, match_id=match_id)
+    try:
+        current_app.extensions['live_broker'].publish(match_channel(match_id), event)
+    except Exception:
+        logger.exception('Unable to publish %s event of match %s', event_type, match_id)
+
+
+def event_stream(subscription, keepalive_seconds):
+    """
+    event_stream(subscription, keepalive_seconds)
+        Server-Sent Events stream of subscription events, sending a comment every keepalive_seconds to keep
+        the connection open
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            event = subscription.get(timeout=keepalive_seconds)
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield 'event: {}\ndata: {}\n\n'.format(event['type'], json.dumps(event))
+    finally:
+        subscription.close()
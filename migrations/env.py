@@ -79,6 +79,9 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Trigram search indexes declared in models need pg_trgm extension
+            connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
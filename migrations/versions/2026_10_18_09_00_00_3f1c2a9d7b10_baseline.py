@@ -0,0 +1,106 @@
+"""baseline
+
+Schema of the databases created with db.create_all() before migrations were tracked. Those databases are marked as
+already at this revision with `flask db stamp 3f1c2a9d7b10` (see migrations/README), new databases create it with
+`flask db upgrade`.
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'games',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'tournaments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('uuid', sa.String(length=64), nullable=True),
+        sa.Column('creator_id', sa.Integer(), nullable=True),
+        sa.Column('game_id', sa.Integer(), nullable=True),
+        sa.Column('max_participants', sa.Integer(), nullable=True),
+        sa.Column('start_date', sa.DateTime(), nullable=True),
+        sa.Column('start_date_tz', sa.String(length=127), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['game_id'], ['games.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('uuid'),
+    )
+    op.create_table(
+        'user_accounts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('oauth_id', sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id', 'oauth_id'),
+    )
+    op.create_table(
+        'matches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('uuid', sa.String(length=64), nullable=True),
+        sa.Column('creator_id', sa.Integer(), nullable=True),
+        sa.Column('game_id', sa.Integer(), nullable=True),
+        sa.Column('is_private', sa.Boolean(), nullable=True),
+        sa.Column('tournament_id', sa.Integer(), nullable=True),
+        sa.Column('max_participants', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['game_id'], ['games.id']),
+        sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('uuid'),
+    )
+    op.create_table(
+        'tournament_participants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tournament_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('participate_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'match_participants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('match_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('participate_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('match_participants')
+    op.drop_table('tournament_participants')
+    op.drop_table('matches')
+    op.drop_table('user_accounts')
+    op.drop_table('tournaments')
+    op.drop_table('users')
+    op.drop_table('games')
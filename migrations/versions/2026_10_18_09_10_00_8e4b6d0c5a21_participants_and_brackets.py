@@ -0,0 +1,125 @@
+"""participant counters, unique participations, tournament brackets and timestamps
+
+Participations and oauth accounts duplicated by concurrent joins and first logins are deleted (the oldest row is
+kept) before their unique constraints are added, and participant_count is backfilled from participants rows. On
+PostgreSQL the participants tables are locked against writes for the transaction, so no duplicate gets in between
+the cleanup and the constraints.
+
+Indexes of the existing tables are created by the next revision, outside of this transaction.
+
+Revision ID: 8e4b6d0c5a21
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b6d0c5a21'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+# Rows of table having an older row (lower key) with the same values of columns
+DUPLICATES_SQL = '''
+DELETE FROM {table} WHERE EXISTS (
+    SELECT 1 FROM {table} AS kept WHERE {same} AND kept.{key} < {table}.{key}
+)
+'''
+PARTICIPANT_COUNT_SQL = '''
+UPDATE {table} SET participant_count = (
+    SELECT COUNT(*) FROM {participants} WHERE {participants}.{key} = {table}.id
+)
+'''
+
+
+def batch_alter_table(table_name):
+    # SQLite can't add columns with a non constant default (nor constraints) in place: the table is copied
+    recreate = 'always' if op.get_context().dialect.name == 'sqlite' else 'auto'
+    return op.batch_alter_table(table_name, recreate=recreate)
+
+
+def delete_duplicates(table, columns, key='id'):
+    same = ' AND '.join('kept.{column} = {table}.{column}'.format(table=table, column=column) for column in columns)
+    op.execute(DUPLICATES_SQL.format(table=table, same=same, key=key))
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('LOCK TABLE match_participants, tournament_participants, user_accounts IN SHARE ROW EXCLUSIVE MODE')
+
+    with batch_alter_table('matches') as batch_op:
+        batch_op.add_column(sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('bracket', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('round', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('position', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('winner_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('matches_winner_id_fkey', 'users', ['winner_id'], ['id'])
+    with batch_alter_table('tournaments') as batch_op:
+        batch_op.add_column(sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('format', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('bracket_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('bracket_generated_at', sa.DateTime(), nullable=True))
+        # Existing tournaments get the migration time
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+
+    op.create_table(
+        'tournament_standings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tournament_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('played', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('wins', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('losses', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('eliminated', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tournament_id', 'user_id', name='uq_tournament_standings_tournament_user'),
+    )
+    op.create_index('ix_tournament_standings_user_id', 'tournament_standings', ['user_id'])
+
+    delete_duplicates('match_participants', ('match_id', 'user_id'))
+    delete_duplicates('tournament_participants', ('tournament_id', 'user_id'))
+    delete_duplicates('user_accounts', ('oauth_id',), key='user_id')
+    with batch_alter_table('match_participants') as batch_op:
+        batch_op.add_column(sa.Column('slot', sa.Integer(), nullable=True))
+        batch_op.create_unique_constraint('uq_match_participants_match_user', ['match_id', 'user_id'])
+    with batch_alter_table('tournament_participants') as batch_op:
+        batch_op.create_unique_constraint('uq_tournament_participants_tournament_user', ['tournament_id', 'user_id'])
+    with batch_alter_table('user_accounts') as batch_op:
+        batch_op.create_unique_constraint('user_accounts_oauth_id_key', ['oauth_id'])
+
+    op.execute(PARTICIPANT_COUNT_SQL.format(table='matches', participants='match_participants', key='match_id'))
+    op.execute(PARTICIPANT_COUNT_SQL.format(table='tournaments', participants='tournament_participants',
+                                            key='tournament_id'))
+
+
+def downgrade():
+    with batch_alter_table('user_accounts') as batch_op:
+        batch_op.drop_constraint('user_accounts_oauth_id_key', type_='unique')
+    with batch_alter_table('tournament_participants') as batch_op:
+        batch_op.drop_constraint('uq_tournament_participants_tournament_user', type_='unique')
+    with batch_alter_table('match_participants') as batch_op:
+        batch_op.drop_constraint('uq_match_participants_match_user', type_='unique')
+        batch_op.drop_column('slot')
+    op.drop_index('ix_tournament_standings_user_id', table_name='tournament_standings')
+    op.drop_table('tournament_standings')
+    with batch_alter_table('tournaments') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('bracket_generated_at')
+        batch_op.drop_column('bracket_size')
+        batch_op.drop_column('format')
+        batch_op.drop_column('participant_count')
+    with batch_alter_table('matches') as batch_op:
+        batch_op.drop_constraint('matches_winner_id_fkey', type_='foreignkey')
+        batch_op.drop_column('winner_id')
+        batch_op.drop_column('position')
+        batch_op.drop_column('round')
+        batch_op.drop_column('bracket')
+        batch_op.drop_column('participant_count')
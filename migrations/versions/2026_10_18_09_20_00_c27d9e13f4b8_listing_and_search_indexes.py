@@ -0,0 +1,95 @@
+"""foreign key, listing, partial and trigram search indexes
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY, outside of the migration transaction, so the
+tables stay writable while they are built. An interrupted build leaves an INVALID index: running the upgrade again
+drops and rebuilds it, and skips the indexes already built.
+
+Revision ID: c27d9e13f4b8
+Revises: 8e4b6d0c5a21
+Create Date: 2026-10-18 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d9e13f4b8'
+down_revision = '8e4b6d0c5a21'
+branch_labels = None
+depends_on = None
+
+FREE_SLOTS_SQL = 'max_participants IS NULL OR participant_count < max_participants'
+# Booleans are compared as rendered by SQLAlchemy for each dialect, so the planner can match the predicate
+OPEN_LOBBY_SQL = 'is_private = {} AND tournament_id IS NULL AND ({})'
+
+# (name, table, columns, options)
+INDEXES = [
+    ('ix_games_name_id', 'games', ['name', 'id'], {}),
+    ('ix_tournaments_creator_id', 'tournaments', ['creator_id'], {}),
+    ('ix_tournaments_game_id', 'tournaments', ['game_id'], {}),
+    ('ix_tournaments_name_id', 'tournaments', ['name', 'id'], {}),
+    ('ix_matches_created_at_id', 'matches', ['created_at', 'id'], {}),
+    ('ix_matches_creator_id', 'matches', ['creator_id'], {}),
+    ('ix_matches_game_id', 'matches', ['game_id'], {}),
+    ('ix_matches_tournament_id', 'matches', ['tournament_id'], {}),
+    ('ix_matches_winner_id', 'matches', ['winner_id'], {}),
+    ('ix_matches_tournament_bracket', 'matches', ['tournament_id', 'bracket', 'round', 'position'],
+     {'unique': True}),
+    ('ix_tournament_participants_user_id', 'tournament_participants', ['user_id'], {}),
+    ('ix_match_participants_user_id', 'match_participants', ['user_id'], {}),
+    # Partial indexes
+    ('ix_tournaments_free_slots_name_id', 'tournaments', ['name', 'id'], {
+        'postgresql_where': sa.text('({}) AND bracket_generated_at IS NULL'.format(FREE_SLOTS_SQL)),
+        'sqlite_where': sa.text('({}) AND bracket_generated_at IS NULL'.format(FREE_SLOTS_SQL)),
+    }),
+    ('ix_matches_public_created_at_id', 'matches', ['created_at', 'id'], {
+        'postgresql_where': sa.text('NOT is_private'), 'sqlite_where': sa.text('NOT is_private'),
+    }),
+    ('ix_matches_free_slots_created_at_id', 'matches', ['created_at', 'id'], {
+        'postgresql_where': sa.text(FREE_SLOTS_SQL), 'sqlite_where': sa.text(FREE_SLOTS_SQL),
+    }),
+    ('ix_matches_open_lobby_game_created_at_id', 'matches', ['game_id', 'created_at', 'id'], {
+        'postgresql_where': sa.text(OPEN_LOBBY_SQL.format('false', FREE_SLOTS_SQL)),
+        'sqlite_where': sa.text(OPEN_LOBBY_SQL.format('0', FREE_SLOTS_SQL)),
+    }),
+] + [
+    # Trigram indexes serving ILIKE '%term%' searches (plain indexes on other databases)
+    ('ix_{}_name_trgm'.format(table), table, ['name'], {
+        'postgresql_using': 'gin', 'postgresql_ops': {'name': 'gin_trgm_ops'},
+    })
+    for table in ('users', 'games', 'matches', 'tournaments')
+]
+
+
+def index_validity(name):
+    """
+    index_validity(name)
+        None if the index doesn't exist, else whether its build completed
+    """
+    return op.get_bind().execute(
+        sa.text('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'), name=name
+    ).scalar()
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, **options)
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Concurrent builds can't run in a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            if not op.get_context().as_sql:
+                valid = index_validity(name)
+                if valid:
+                    continue
+                if valid is not None:
+                    op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, columns, postgresql_concurrently=True, **options)
+
+
+def downgrade():
+    for name, table, columns, options in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
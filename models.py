@@ -1,21 +1,84 @@
 import os
 from datetime import datetime
-from sqlalchemy import Column
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Column, DDL, event, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from db_metrics import InstrumentedQueuePool
+from public_id import generate_public_id
+import brackets
+import db_routing
 import json
 
 
-db = SQLAlchemy()
+db = db_routing.RoutingSQLAlchemy()
 
 
-def setup_db(app, database_path):
+# Trigram indexes used by searches need pg_trgm extension on PostgreSQL
+event.listen(db.metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+
+def trigram_index(table_name, column_name):
+    """
+    trigram_index(table_name, column_name)
+        GIN pg_trgm index serving ILIKE '%term%' searches on column_name. Other databases get a plain index
+    """
+    return db.Index(
+        'ix_{}_{}_trgm'.format(table_name, column_name), column_name,
+        postgresql_using='gin', postgresql_ops={column_name: 'gin_trgm_ops'},
+    )
+
+
+def pool_config_from_env():
     """
-    setup_db(app)
-        binds a flask application and a SQLAlchemy service
+    pool_config_from_env()
+        read connection pool settings from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds),
+        DB_POOL_RECYCLE (seconds), DB_POOL_PRE_PING and DB_STATEMENT_TIMEOUT (milliseconds) environment variables
+    """
+    settings = (
+        ('pool_size', 'DB_POOL_SIZE', int),
+        ('max_overflow', 'DB_MAX_OVERFLOW', int),
+        ('pool_timeout', 'DB_POOL_TIMEOUT', float),
+        ('pool_recycle', 'DB_POOL_RECYCLE', int),
+        ('pool_pre_ping', 'DB_POOL_PRE_PING', lambda value: value.lower() in ('1', 'true', 'yes')),
+        ('statement_timeout', 'DB_STATEMENT_TIMEOUT', int),
+    )
+    return {key: cast(os.environ[env]) for key, env, cast in settings if os.environ.get(env)}
+
+
+def engine_options(database_path, pool_config):
+    """
+    engine_options(database_path, pool_config)
+        SQLAlchemy engine options applying pool_config. Pool sizing and statement timeout are only applied to
+        server databases (SQLite keeps the pool chosen by Flask-SQLAlchemy)
+    """
+    if database_path.startswith('sqlite'):
+        return {}
+    pool_config = dict(pool_config)
+    options = {'pool_pre_ping': pool_config.pop('pool_pre_ping', True)}
+    statement_timeout = pool_config.pop('statement_timeout', None)
+    if statement_timeout and database_path.startswith('postgres'):
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(statement_timeout)}
+    options['poolclass'] = InstrumentedQueuePool
+    options.update(pool_config)
+    return options
+
+
+def setup_db(app, database_path, pool_config=None, replica_paths=None):
+    """
+    setup_db(app, database_path, pool_config, replica_paths)
+        binds a flask application and a SQLAlchemy service. pool_config (see pool_config_from_env) defaults to
+        the environment settings, replica_paths (read-only replicas of database_path) to the comma separated
+        DATABASE_REPLICA_URLS environment variable
     """
     database_path = database_path or os.environ['DATABASE_URL']
+    if pool_config is None:
+        pool_config = pool_config_from_env()
+    if replica_paths is None:
+        replica_paths = [path for path in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if path]
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path, pool_config)
+    db_routing.init_app(app, replica_paths)
     db.app = app
     db.init_app(app)
 
@@ -39,9 +102,262 @@ class ModelAction(db.Model):
     def short(self):
         raise NotImplementedError
 
+    def add_with_public_id(self, prefix, attempts=3):
+        """
+        add_with_public_id(prefix, attempts)
+            add and flush the row with a new public id (see public_id.py) as uuid, drawing another one if it clashes
+            with an existing row. Changes are flushed but not committed
+        """
+        for attempt in range(attempts):
+            self.uuid = generate_public_id(prefix)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(self)
+                    db.session.flush()
+                return self
+            except IntegrityError:
+                clash = db.session.query(type(self).id).filter(type(self).uuid == self.uuid).first()
+                if not clash or attempt == attempts - 1:
+                    raise
+
+    @classmethod
+    def view_options(cls, view, exclude=()):
+        """
+        view_options(view, exclude)
+            loader options fetching every relationship read by the 'short' or 'long' view in a fixed number of
+            batched queries, so serializing a page of results doesn't lazy load row by row. Relationships named in
+            exclude are left out (i.e. when the query already joins and loads them with contains_eager)
+        """
+        return []
+
+
+def insert_with_public_ids(table, rows, prefix, attempts=3):
+    """
+    insert_with_public_ids(table, rows, prefix, attempts)
+        bulk insert rows with new public ids as uuid, like ModelAction.add_with_public_id()
+    """
+    for attempt in range(attempts):
+        uuids = [generate_public_id(prefix) for _ in rows]
+        for row, uuid in zip(rows, uuids):
+            row['uuid'] = uuid
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(rows))
+            return
+        except IntegrityError:
+            clash = db.session.execute(select([table.c.id]).where(table.c.uuid.in_(uuids)).limit(1)).first()
+            if not clash or attempt == attempts - 1:
+                raise
+
+
+# SQL of ParticipantsMixin.free_slots_filter(), for partial indexes
+FREE_SLOTS_SQL = 'max_participants IS NULL OR participant_count < max_participants'
+# SQL of Match.open_lobby_filter() (but the game), by dialect: booleans are compared as rendered by SQLAlchemy, so
+# the planner can match the index predicate
+OPEN_LOBBY_SQL = 'is_private = {} AND tournament_id IS NULL AND ({})'
+
+
+class ParticipantsClosed(Exception):
+    pass
+
+
+class ParticipantsMixin:
+    """
+    ParticipantsMixin
+        participants of matches and tournaments, with capacity (max_participants) enforced by the database: the
+        participant_count column is only changed by guarded UPDATEs on the parent row, so concurrent joins can't
+        overfill it, and listings read it instead of counting rows. Subclasses define participation_key() (the
+        participations column referencing them) and may close registrations with open_filter()
+    """
+    JOINED = 'joined'
+    FULL = 'full'
+    ALREADY_JOINED = 'already_joined'
+    CLOSED = 'closed'
+
+    @classmethod
+    def participation_key(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def open_filter(cls):
+        """
+        open_filter()
+            condition on the parent row allowing participants changes, None if always allowed
+        """
+        return None
+
+    @classmethod
+    def changeable(cls, condition):
+        open_filter = cls.open_filter()
+        return condition if open_filter is None else condition & open_filter
+
+    @classmethod
+    def free_slots_filter(cls):
+        """
+        free_slots_filter()
+            condition on rows that can take one more participant. Listings filtered by it (?hasFreeSlots=1) are
+            served by the partial indexes declared with the same condition (see FREE_SLOTS_SQL)
+        """
+        table = cls.__table__
+        return cls.changeable(
+            (table.c.max_participants == None) | (table.c.participant_count < table.c.max_participants)
+        )
+
+    def expire_participants(self):
+        db.session.expire(self, ['participant_count', 'participants', 'updated_at'])
+
+    def is_open(self):
+        open_filter = self.open_filter()
+        if open_filter is None:
+            return True
+        table = self.__table__
+        return db.session.execute(select([table.c.id]).where((table.c.id == self.id) & open_filter)).first() is not None
+
+    def join(self, user_id):
+        """
+        join(user_id)
+            add user_id to the participants. The free slot is reserved by a guarded UPDATE on the parent row, and
+            the unique (parent, user_id) constraint rejects double joins. Return JOINED, FULL, ALREADY_JOINED or
+            CLOSED. Changes are flushed but not committed
+        """
+        table = self.__table__
+        key = self.participation_key()
+        try:
+            with db.session.begin_nested():
+                reserved = db.session.execute(
+                    table.update()
+                    .where((table.c.id == self.id) & self.free_slots_filter())
+                    .values(participant_count=table.c.participant_count + 1)
+                ).rowcount
+                if not reserved:
+                    return self.FULL if self.is_open() else self.CLOSED
+                db.session.execute(key.class_.__table__.insert().values({key.key: self.id, 'user_id': user_id}))
+        except IntegrityError:
+            return self.ALREADY_JOINED
+        finally:
+            self.expire_participants()
+        return self.JOINED
+
+    def remove_participants(self, user_ids):
+        """
+        remove_participants(user_ids)
+            remove user_ids from the participants, return how many were removed (0 when closed). Changes are flushed
+            but not committed
+        """
+        table = self.__table__
+        key = self.participation_key()
+        participations = key.class_.__table__
+        try:
+            with db.session.begin_nested():
+                removed = db.session.execute(
+                    participations.delete()
+                    .where((participations.c[key.key] == self.id) & participations.c.user_id.in_(user_ids))
+                ).rowcount
+                if removed and not db.session.execute(
+                    table.update()
+                    .where(self.changeable(table.c.id == self.id))
+                    .values(participant_count=table.c.participant_count - removed)
+                ).rowcount:
+                    raise ParticipantsClosed()  # Undo the delete
+        except ParticipantsClosed:
+            removed = 0
+        self.expire_participants()
+        return removed
+
+    def add_participants(self, user_ids):
+        """
+        add_participants(user_ids)
+            add many users to the participants: users are resolved with a single IN query, free slots are reserved
+            with a guarded UPDATE (retried if a concurrent write changed the counter) and participants are inserted
+            with a single multi-row INSERT. Return a report of added, already joined, missing (not existing) and
+            rejected (no free slot left, or closed) user ids. Changes are flushed but not committed
+        """
+        table = self.__table__
+        key = self.participation_key()
+        participations = key.class_
+        report = {'added': [], 'already_joined': [], 'missing': [], 'rejected': []}
+        candidates = list(dict.fromkeys(user_ids))
+        for _ in range(10):
+            if not candidates:
+                break
+            found = dict(
+                db.session.query(User.id, participations.id)
+                .outerjoin(participations, (participations.user_id == User.id) & (key == self.id))
+                .filter(User.id.in_(candidates))
+            )
+            report['missing'] += [user_id for user_id in candidates if user_id not in found]
+            report['already_joined'] += [user_id for user_id in candidates if found.get(user_id)]
+            candidates = [user_id for user_id in candidates if user_id in found and not found[user_id]]
+            count, max_participants = db.session.execute(
+                select([table.c.participant_count, table.c.max_participants]).where(table.c.id == self.id)
+            ).first()
+            free_slots = len(candidates) if max_participants is None else max(0, max_participants - count)
+            accepted = candidates[:free_slots]
+            if not accepted:
+                break
+            try:
+                with db.session.begin_nested():
+                    reserved = db.session.execute(
+                        table.update()
+                        .where(self.changeable((table.c.id == self.id) & (table.c.participant_count == count)))
+                        .values(participant_count=count + len(accepted))
+                    ).rowcount
+                    if reserved:
+                        db.session.execute(participations.__table__.insert().values([
+                            {key.key: self.id, 'user_id': user_id, 'participate_date': datetime.now()}
+                            for user_id in accepted
+                        ]))
+            except IntegrityError:
+                continue  # Some user joined concurrently, check them again
+            if reserved:
+                report['added'] = accepted
+                candidates = candidates[len(accepted):]
+                break
+            if not self.is_open():
+                break
+        report['rejected'] = candidates
+        self.expire_participants()
+        return report
+
+    @staticmethod
+    def is_user_id_list(value):
+        return isinstance(value, list) and all(isinstance(item, int) and not isinstance(item, bool) for item in value)
+
+    def update_participants(self, add=(), remove=()):
+        """
+        update_participants(add, remove)
+            remove then add participants in bulk, return the add_participants() report with the removed count
+        """
+        removed = self.remove_participants(remove) if remove else 0
+        report = self.add_participants(add)
+        report['removed'] = removed
+        return report
+
+    @classmethod
+    def recount_participants(cls, fix=True):
+        """
+        recount_participants(fix)
+            recompute participant_count of every row from participations rows, return how many were wrong. With
+            fix=False wrong rows are only counted
+        """
+        table = cls.__table__
+        key = cls.participation_key()
+        counts = select([func.count(key.class_.id)]).where(key == table.c.id).as_scalar()
+        wrong = table.c.participant_count != counts
+        if not fix:
+            return db.session.execute(select([func.count()]).select_from(table).where(wrong)).scalar()
+        updated = db.session.execute(
+            table.update()
+            .where(wrong)
+            .values(participant_count=counts, updated_at=table.c.updated_at)
+        ).rowcount
+        db.session.commit()
+        return updated
+
 
 class User(ModelAction):
     __tablename__ = 'users'
+    __table_args__ = (trigram_index('users', 'name'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, unique=True)
     match_participations = db.relationship('MatchParticipants', backref='user')
@@ -53,6 +369,30 @@ class User(ModelAction):
         if not auth0_id:
             pass
 
+    @classmethod
+    def get_by_oauth_id(cls, oauth_id):
+        return cls.query.join(UserAccount, UserAccount.user_id == cls.id).filter(UserAccount.oauth_id == oauth_id).first()
+
+    @classmethod
+    def get_or_create_by_oauth_id(cls, oauth_id):
+        """
+        get_or_create_by_oauth_id(oauth_id)
+            return the user owning the oauth account, creating both user and account in a single transaction on
+            first login. If a concurrent request creates them first the existing user is returned
+        """
+        user = cls.get_by_oauth_id(oauth_id)
+        if user:
+            return user
+        user = cls(name=oauth_id)
+        user.oauth_accounts.append(UserAccount(oauth_id=oauth_id))
+        try:
+            with db.session.begin_nested():
+                db.session.add(user)
+        except IntegrityError:
+            return cls.get_by_oauth_id(oauth_id)
+        db.session.commit()
+        return user
+
     def base_info(self):
         oauth_accounts = []
         for oauth in self.oauth_accounts:
@@ -79,12 +419,16 @@ class User(ModelAction):
 class UserAccount(ModelAction):
     __tablename__ = 'user_accounts'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    oauth_id = db.Column(db.String(255), primary_key=True)
+    oauth_id = db.Column(db.String(255), primary_key=True, unique=True)
     user = db.relationship('User', backref='oauth_accounts')
 
 
 class Game(ModelAction):
     __tablename__ = 'games'
+    __table_args__ = (
+        trigram_index('games', 'name'),
+        db.Index('ix_games_name_id', 'name', 'id'),  # Listing order
+    )
     id = Column(db.Integer, primary_key=True)
     name = Column(db.String)
 
@@ -101,23 +445,118 @@ class Game(ModelAction):
         }
 
 
-class Match(ModelAction):
+class Match(ParticipantsMixin, ModelAction):
     __tablename__ = 'matches'
+    __table_args__ = (
+        trigram_index('matches', 'name'),
+        db.Index('ix_matches_created_at_id', 'created_at', 'id'),  # Listing order
+        # Public matches listing, the most frequent GET /matches query
+        db.Index(
+            'ix_matches_public_created_at_id', 'created_at', 'id',
+            postgresql_where=db.text('NOT is_private'), sqlite_where=db.text('NOT is_private'),
+        ),
+        # Listings of matches with free slots (?hasFreeSlots=1)
+        db.Index(
+            'ix_matches_free_slots_created_at_id', 'created_at', 'id',
+            postgresql_where=db.text(FREE_SLOTS_SQL), sqlite_where=db.text(FREE_SLOTS_SQL),
+        ),
+        # Matchmaking: oldest open lobby of a game (see Match.matchmake())
+        db.Index(
+            'ix_matches_open_lobby_game_created_at_id', 'game_id', 'created_at', 'id',
+            postgresql_where=db.text(OPEN_LOBBY_SQL.format('false', FREE_SLOTS_SQL)),
+            sqlite_where=db.text(OPEN_LOBBY_SQL.format('0', FREE_SLOTS_SQL)),
+        ),
+        # Bracket slot lookups when a result advances players
+        db.Index('ix_matches_tournament_bracket', 'tournament_id', 'bracket', 'round', 'position', unique=True),
+    )
     id = Column(db.Integer, primary_key=True)
     name = Column(db.String)
     uuid = Column(db.String(64), unique=True)
-    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    game_id = db.Column(db.Integer, db.ForeignKey('games.id'))
+    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), index=True)
     is_private = db.Column(db.Boolean, default=False)
-    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=True, index=True)
     max_participants = db.Column(db.Integer, nullable=True)
+    # Number of match_participants rows, maintained by ParticipantsMixin methods
+    participant_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Position in the tournament bracket (see brackets.py), set on matches generated by Tournament.generate_bracket()
+    bracket = db.Column(db.String(16), nullable=True)
+    round = db.Column(db.Integer, nullable=True)
+    position = db.Column(db.Integer, nullable=True)
+    winner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime(), default=datetime.now)
     updated_at = db.Column(db.DateTime(), default=datetime.now, onupdate=datetime.now)
-    creator = db.relationship('User', backref='created_matches')
+    creator = db.relationship('User', backref='created_matches', foreign_keys=[creator_id])
     match_participations = db.relationship('MatchParticipants', backref='match')
     # users = db.relationship('User', backref=db.backref('matches', cascade="all, delete-orphan"))
     game = db.relationship('Game', backref='matches')
 
+    @classmethod
+    def participation_key(cls):
+        return MatchParticipants.match_id
+
+    @classmethod
+    def visible_to(cls, user):
+        """
+        visible_to(user)
+            filter of the matches user (None if anonymous) can see: public ones and their own
+        """
+        if user:
+            return (cls.is_private == False) | (cls.creator_id == user.id)
+        return cls.is_private == False
+
+    CREATED = 'created'  # matchmake() outcome
+
+    @classmethod
+    def open_lobby_filter(cls, game_id):
+        """
+        open_lobby_filter(game_id)
+            filter of the public, non tournament matches of game_id with free slots, the ones matchmaking fills
+        """
+        return (cls.game_id == game_id) & (cls.is_private == False) & (cls.tournament_id == None) \
+            & cls.free_slots_filter()
+
+    @classmethod
+    def matchmake(cls, game, user_id, max_participants=None, attempts=3):
+        """
+        matchmake(game, user_id, max_participants, attempts)
+            place user_id in the oldest open lobby of game (only lobbies of max_participants size, if given), or
+            create a new one. Return (match, outcome): JOINED, CREATED, or ALREADY_JOINED when user_id was already
+            waiting in the lobby (nobody joined).
+            Candidates are locked with FOR UPDATE SKIP LOCKED, so concurrent callers spread over different lobbies
+            instead of queueing on the same row (databases without row locks rely on the guarded join). Changes are
+            flushed but not committed
+        """
+        lobbies = db.session.query(cls).filter(cls.open_lobby_filter(game.id))
+        if max_participants is not None:
+            lobbies = lobbies.filter(cls.max_participants == max_participants)
+        waiting = lobbies.join(MatchParticipants, MatchParticipants.match_id == cls.id) \
+            .filter(MatchParticipants.user_id == user_id).order_by(cls.created_at, cls.id).first()
+        if waiting:
+            return waiting, cls.ALREADY_JOINED
+        for _ in range(attempts):
+            match = lobbies.order_by(cls.created_at, cls.id).with_for_update(skip_locked=True).first()
+            if not match:
+                break
+            joined = match.join(user_id)
+            if joined in (cls.JOINED, cls.ALREADY_JOINED):
+                return match, joined
+        match = cls(
+            name='{} lobby'.format(game.name), game_id=game.id, creator_id=user_id,
+            max_participants=max_participants or 2, is_private=False, participant_count=1,
+        )
+        match.add_with_public_id('m')
+        db.session.add(MatchParticipants(match_id=match.id, user_id=user_id))
+        db.session.flush()
+        return match, cls.CREATED
+
+    @classmethod
+    def view_options(cls, view, exclude=()):
+        loaders = {'game': joinedload, 'participants': selectinload}
+        if view == 'long':
+            loaders.update(creator=joinedload, tournament=joinedload)
+        return [loader(getattr(cls, name)) for name, loader in loaders.items() if name not in exclude]
+
     def short(self):
         game = self.game.short() if self.game else None
         participants = []
@@ -130,6 +569,7 @@ class Match(ModelAction):
             'game_id': self.game_id,
             'game': game,
             'max_participants': self.max_participants,
+            'participant_count': self.participant_count,
             'participants': participants,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
@@ -162,30 +602,197 @@ class Match(ModelAction):
             'game_id': self.game_id,
             'game': game,
             'max_participants': self.max_participants,
+            'participant_count': self.participant_count,
             'tournament': tournament,
             'participants': participants,
             'is_private': self.is_private,
+            'bracket': self.bracket,
+            'round': self.round,
+            'position': self.position,
+            'winner_id': self.winner_id,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
         return match
 
-class Tournament(ModelAction):
+class Tournament(ParticipantsMixin, ModelAction):
     __tablename__ = 'tournaments'
+    __table_args__ = (
+        trigram_index('tournaments', 'name'),
+        db.Index('ix_tournaments_name_id', 'name', 'id'),  # Listing order
+        # Listings of tournaments open to registrations with free slots (?hasFreeSlots=1)
+        db.Index(
+            'ix_tournaments_free_slots_name_id', 'name', 'id',
+            postgresql_where=db.text('({}) AND bracket_generated_at IS NULL'.format(FREE_SLOTS_SQL)),
+            sqlite_where=db.text('({}) AND bracket_generated_at IS NULL'.format(FREE_SLOTS_SQL)),
+        ),
+    )
     id = Column(db.Integer, primary_key=True)
     name = Column(db.String)
     uuid = Column(db.String(64), unique=True)
-    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    game_id = db.Column(db.Integer, db.ForeignKey('games.id'))
+    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), index=True)
     max_participants = db.Column(db.Integer, nullable=True)
+    # Number of tournament_participants rows, maintained by ParticipantsMixin methods
+    participant_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     start_date = db.Column(db.DateTime, nullable=True)
     start_date_tz = db.Column(db.String(127), nullable=True, default='+00:00')
+    # Bracket format (brackets.FORMATS) and slots count, set when the bracket is generated
+    format = db.Column(db.String(32), nullable=True)
+    bracket_size = db.Column(db.Integer, nullable=True)
+    bracket_generated_at = db.Column(db.DateTime(), nullable=True)
+    # Server defaults also fill the rows existing when the columns are added (see flask backfill-timestamps)
+    created_at = db.Column(db.DateTime(), default=datetime.now, server_default=func.now())
+    updated_at = db.Column(db.DateTime(), default=datetime.now, onupdate=datetime.now, server_default=func.now())
     creator = db.relationship('User', backref='created_tournaments')
     tournament_participations = db.relationship('TournamentParticipants', backref='tournament')
     users = db.relationship('User', backref=db.backref('users', cascade="all, delete-orphan"))
     matches = db.relationship('Match', backref='tournament')
     game = db.relationship('Game', backref='tournaments')
 
+    @classmethod
+    def view_options(cls, view, exclude=()):
+        options = {'game': [joinedload(cls.game)]}
+        if view == 'short':
+            options['participants'] = [selectinload(cls.participants)]
+        return [option for name in options if name not in exclude for option in options[name]]
+
+    @classmethod
+    def participation_key(cls):
+        return TournamentParticipants.tournament_id
+
+    @classmethod
+    def open_filter(cls):
+        # Registrations close when the bracket is generated
+        return cls.__table__.c.bracket_generated_at == None
+
+    def generate_bracket(self, format):
+        """
+        generate_bracket(format)
+            create the bracket matches (see brackets.layout) of the current participants, seeded by registration
+            order, with their players and a zeroed standings row per participant, all by bulk inserts. Raise
+            BracketError if the bracket was already generated or participants don't fit the format. Changes are
+            flushed but not committed
+        """
+        tournaments = Tournament.__table__
+        matches = Match.__table__
+        now = datetime.now()
+        if format not in brackets.FORMATS:
+            raise brackets.BracketError('Unknown tournament format: {}'.format(format))
+        # Claim the tournament row first, so concurrent generations and registrations wait for this one
+        claimed = db.session.execute(
+            tournaments.update()
+            .where((tournaments.c.id == self.id) & (tournaments.c.bracket_generated_at == None))
+            .values(format=format, bracket_generated_at=now)
+        ).rowcount
+        db.session.expire(self)
+        if not claimed:
+            raise brackets.BracketError('Tournament bracket was already generated')
+        players = [user_id for user_id, in db.session.query(TournamentParticipants.user_id)
+                   .filter(TournamentParticipants.tournament_id == self.id)
+                   .order_by(TournamentParticipants.participate_date, TournamentParticipants.id)]
+        size = brackets.bracket_size(format, len(players))
+        layout = brackets.layout(format, len(players))
+        db.session.execute(tournaments.update().where(tournaments.c.id == self.id).values(bracket_size=size))
+        insert_with_public_ids(matches, [{
+            'name': '{} - {} round {} #{}'.format(self.name, match['bracket'].capitalize(), match['round'],
+                                                  match['position'] + 1),
+            'creator_id': self.creator_id,
+            'game_id': self.game_id,
+            'tournament_id': self.id,
+            'is_private': False,
+            'max_participants': 2,
+            'participant_count': len([seed for seed in match['players'] if seed is not None]),
+            'bracket': match['bracket'],
+            'round': match['round'],
+            'position': match['position'],
+            'winner_id': players[match['winner']] if match['winner'] is not None else None,
+            'created_at': now,
+            'updated_at': now,
+        } for match in layout], 'm')
+        match_ids = {
+            (bracket, round, position): match_id for match_id, bracket, round, position in db.session.execute(
+                select([matches.c.id, matches.c.bracket, matches.c.round, matches.c.position])
+                .where((matches.c.tournament_id == self.id) & (matches.c.bracket != None))
+            )
+        }
+        match_players = [{
+            'match_id': match_ids[(match['bracket'], match['round'], match['position'])],
+            'user_id': players[seed],
+            'slot': slot,
+            'participate_date': now,
+        } for match in layout for slot, seed in enumerate(match['players']) if seed is not None]
+        if match_players:
+            db.session.execute(MatchParticipants.__table__.insert().values(match_players))
+        db.session.execute(TournamentStanding.__table__.insert().values([
+            {'tournament_id': self.id, 'user_id': user_id, 'updated_at': now} for user_id in players
+        ]))
+        return len(layout)
+
+    def record_result(self, match_id, winner_id):
+        """
+        record_result(match_id, winner_id)
+            store the winner of a bracket match, update winner and loser standings in place and move them to their
+            next bracket matches. Raise BracketError if the match isn't ready or its result is already known. Changes
+            are flushed but not committed
+        """
+        tournaments = Tournament.__table__
+        matches = Match.__table__
+        participants = MatchParticipants.__table__
+        standings = TournamentStanding.__table__
+        now = datetime.now()
+        match = db.session.execute(
+            select([matches.c.id, matches.c.bracket, matches.c.round, matches.c.position, matches.c.winner_id])
+            .where((matches.c.id == match_id) & (matches.c.tournament_id == self.id) & (matches.c.bracket != None))
+        ).first()
+        if not match:
+            raise brackets.BracketError('Match is not part of the tournament bracket')
+        players = [user_id for user_id, in db.session.execute(
+            select([participants.c.user_id]).where(participants.c.match_id == match.id).order_by(participants.c.slot)
+        )]
+        if match.winner_id is not None:
+            raise brackets.BracketError('Match result was already recorded')
+        if len(players) != 2:
+            raise brackets.BracketError('Match players are not known yet')
+        if winner_id not in players:
+            raise brackets.BracketError('Winner must be one of the match players')
+        loser_id = players[1] if players[0] == winner_id else players[0]
+        # Guarded on winner_id, so a result recorded concurrently is never applied twice
+        recorded = db.session.execute(
+            matches.update().where((matches.c.id == match.id) & (matches.c.winner_id == None)).values(winner_id=winner_id)
+        ).rowcount
+        if not recorded:
+            raise brackets.BracketError('Match result was already recorded')
+        standing = (standings.c.tournament_id == self.id)
+        db.session.execute(
+            standings.update().where(standing & (standings.c.user_id == winner_id))
+            .values(played=standings.c.played + 1, wins=standings.c.wins + 1, updated_at=now)
+        )
+        loser_values = {'played': standings.c.played + 1, 'losses': standings.c.losses + 1, 'updated_at': now}
+        if brackets.loser_eliminated(self.format, match.bracket):
+            loser_values['eliminated'] = True
+        db.session.execute(standings.update().where(standing & (standings.c.user_id == loser_id)).values(loser_values))
+        next_slots = brackets.next_slots(self.format, self.bracket_size, match.bracket, match.round, match.position)
+        for user_id, next_slot in zip((winner_id, loser_id), next_slots):
+            if next_slot is None:
+                continue
+            bracket, round, position, slot = next_slot
+            next_match_id = db.session.execute(select([matches.c.id]).where(
+                (matches.c.tournament_id == self.id) & (matches.c.bracket == bracket) & (matches.c.round == round)
+                & (matches.c.position == position)
+            )).scalar()
+            db.session.execute(
+                matches.update().where(matches.c.id == next_match_id)
+                .values(participant_count=matches.c.participant_count + 1)
+            )
+            db.session.execute(participants.insert().values(
+                match_id=next_match_id, user_id=user_id, slot=slot, participate_date=now
+            ))
+        # Bracket and standings responses are versioned by the tournament updated_at
+        db.session.execute(tournaments.update().where(tournaments.c.id == self.id).values(updated_at=now))
+        db.session.expire(self, ['updated_at'])
+        return {'match_id': match.id, 'winner_id': winner_id, 'loser_id': loser_id}
+
     def short(self):
         game = self.game.short() if self.game else None
         participants = []
@@ -199,6 +806,7 @@ class Tournament(ModelAction):
             'game': game,
             'creator_id': self.creator_id,
             'max_participants': self.max_participants,
+            'participant_count': self.participant_count,
             'participants': participants,
             'start_date': self.start_date,
             'start_date_tz': self.start_date_tz,
@@ -206,18 +814,15 @@ class Tournament(ModelAction):
         return match
 
     def long(self):
-        matches = []
-        for match in self.matches:
-            matches.append(match.short())
+        """
+        long()
+            tournament details with matches and participants counts, and links to the paginated matches and
+            participants (the route embeds them on request, see GET /tournaments/<uuid>?expand=)
+        """
         game = self.game
         if game:
             game = game.short()
-        creator = self.creator
-        if creator:
-            creator.short()
-        participants = []
-        for participant in self.participants:
-            participants.append(participant.short())
+        matches_count = db.session.query(func.count(Match.id)).filter(Match.tournament_id == self.id).scalar()
 
         match = {
             'id': self.id,
@@ -227,25 +832,56 @@ class Tournament(ModelAction):
             'game_id': self.game_id,
             'game': game,
             'max_participants': self.max_participants,
-            'matches': matches,
-            'participants': participants,
+            'matches_count': matches_count,
+            'participants_count': self.participant_count,
+            'links': {
+                'matches': '/tournaments/{}/matches'.format(self.uuid),
+                'participants': '/tournaments/{}/participants'.format(self.uuid),
+                'bracket': '/tournaments/{}/bracket'.format(self.uuid),
+                'standings': '/tournaments/{}/standings'.format(self.uuid),
+            },
             'start_date': self.start_date,
-            'start_date_tz': self.start_date_tz
+            'start_date_tz': self.start_date_tz,
+            'format': self.format,
+            'bracket_generated_at': self.bracket_generated_at,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
         }
         return match
 
 
 class TournamentParticipants(ModelAction):
     __tablename__ = 'tournament_participants'
+    __table_args__ = (db.UniqueConstraint('tournament_id', 'user_id', name='uq_tournament_participants_tournament_user'),)
     id = db.Column(db.Integer, primary_key=True)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     participate_date = db.Column(db.DateTime(), default=datetime.now)
 
 
+class TournamentStanding(ModelAction):
+    """
+    TournamentStanding
+        results of a participant in a tournament bracket, updated in place by Tournament.record_result() so standings
+        are read without aggregating match results
+    """
+    __tablename__ = 'tournament_standings'
+    __table_args__ = (db.UniqueConstraint('tournament_id', 'user_id', name='uq_tournament_standings_tournament_user'),)
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    played = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    wins = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    losses = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    eliminated = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    updated_at = db.Column(db.DateTime(), default=datetime.now, onupdate=datetime.now)
+
+
 class MatchParticipants(ModelAction):
     __tablename__ = 'match_participants'
+    __table_args__ = (db.UniqueConstraint('match_id', 'user_id', name='uq_match_participants_match_user'),)
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    slot = db.Column(db.Integer, nullable=True)  # Side (0 or 1) of the player in tournament bracket matches
     participate_date = db.Column(db.DateTime(), default=datetime.now)
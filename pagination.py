@@ -0,0 +1,106 @@
+import json
+import base64
+from datetime import datetime
+from flask import request, abort
+from sqlalchemy import and_, or_, false
+
+
+def paginate(q, name, order_by, default_per_page, max_per_page, descending=False):
+    """
+    paginate(q, name, order_by, default_per_page, max_per_page)
+        paginate q according to request args, returning the page items and the pagination info to add to the
+        response. By default pages are numbered (page/perPage args, OFFSET query plus a total count). Passing a
+        'cursor' arg (empty for the first page) switches to keyset pagination: rows are ordered by the order_by
+        columns (which must end with a unique one) and each page is a single range scan starting after the cursor.
+        NULL values sort as the highest ones (the PostgreSQL default, so indexes still serve the order). In that mode
+        the total count is computed only if 'withTotal' arg is passed
+    """
+    per_page = request.args.get('perPage', default_per_page, type=int)
+    if 'cursor' not in request.args:
+        page = request.args.get('page', 1, type=int)
+        pagination = q.paginate(page, per_page, max_per_page)
+        return pagination.items, {
+            'total_{}'.format(name): pagination.total,
+            'page': pagination.page,
+            'pages': pagination.pages,
+        }
+
+    per_page = max(1, min(per_page, max_per_page))
+    page_q = q.order_by(None).order_by(*[sort_key(column, descending) for column in order_by])
+    cursor = request.args.get('cursor', '', str)
+    if cursor:
+        page_q = page_q.filter(_after_cursor(order_by, decode_cursor(cursor, order_by), descending))
+    items = page_q.limit(per_page + 1).all()  # Fetch one more row to know if there is a next page
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in order_by])
+    page_info = {
+        'next_cursor': next_cursor,
+        'per_page': per_page,
+    }
+    if request.args.get('withTotal', 0, type=int):
+        page_info['total_{}'.format(name)] = q.order_by(None).count()
+    return items, page_info
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def nullable(column):
+    return getattr(column.expression, 'nullable', True)
+
+
+def sort_key(column, descending):
+    if descending:
+        return column.desc().nullsfirst() if nullable(column) else column.desc()
+    return column.asc().nullslast() if nullable(column) else column.asc()
+
+
+def decode_cursor(cursor, order_by):
+    """
+    decode_cursor(cursor, order_by)
+        values of the order_by columns encoded in cursor. Abort with 400 if the cursor is malformed or a value
+        doesn't match the type of its column
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(order_by):
+            raise ValueError
+        return [decode_value(column, value) for column, value in zip(order_by, values)]
+    except (ValueError, TypeError):
+        abort(400, 'Invalid cursor')
+
+
+def decode_value(column, value):
+    if value is None:
+        if not nullable(column):
+            raise ValueError
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if python_type is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if python_type is str and isinstance(value, str):
+        return value
+    raise ValueError
+
+
+def _after_cursor(order_by, values, descending):
+    # (c1, c2, ...) > (v1, v2, ...) expanded as c1 > v1 OR (c1 = v1 AND c2 > v2) OR ..., NULL being the highest value
+    conditions = []
+    for i, column in enumerate(order_by):
+        equal = [order_by[j].is_(None) if values[j] is None else order_by[j] == values[j] for j in range(i)]
+        conditions.append(and_(*equal, _after_value(column, values[i], descending)))
+    return or_(*conditions)
+
+
+def _after_value(column, value, descending):
+    if value is None:
+        return column.isnot(None) if descending else false()
+    if descending:
+        return column < value
+    return or_(column > value, column.is_(None)) if nullable(column) else column > value
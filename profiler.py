@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import logging
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('sql_profiler')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    query_budget(max_queries)
+        decorator setting how many SQL queries a view may run per request (overriding SQL_QUERY_BUDGET)
+    """
+    def query_budget_decorator(f):
+        f.query_budget = max_queries
+        return f
+    return query_budget_decorator
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so failed statements (never reaching after_cursor_execute) leave nothing behind
+    context._sql_profile_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._sql_profile_start
+    if not has_request_context() or 'sql_profile' not in g:
+        return
+    profile = g.sql_profile
+    profile['count'] += 1
+    profile['time'] += duration
+    slowest = profile['slowest']
+    slowest.append((duration, statement))
+    slowest.sort(key=lambda query: query[0], reverse=True)
+    del slowest[profile['keep_slowest']:]
+
+
+def init_app(app):
+    """
+    init_app(app)
+        profile SQL queries of every request: query count, total database time and slowest statements are sent in
+        the Server-Timing header and logged. Statements slower than SQL_SLOW_QUERY_MS are logged as warnings. A request
+        running more queries than its budget (SQL_QUERY_BUDGET or the view query_budget) is logged, and fails when
+        SQL_QUERY_BUDGET_STRICT is set (by default when app.testing, read on each request)
+    """
+    app.config.setdefault('SQL_SLOW_QUERY_MS', int(os.environ.get('SQL_SLOW_QUERY_MS', 200)))
+    app.config.setdefault('SQL_PROFILER_KEEP_SLOWEST', 3)
+    app.config.setdefault('SQL_QUERY_BUDGET', int(os.environ['SQL_QUERY_BUDGET']) if os.environ.get('SQL_QUERY_BUDGET') else None)
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile = {'count': 0, 'time': 0.0, 'slowest': [], 'keep_slowest': app.config['SQL_PROFILER_KEEP_SLOWEST']}
+
+    @app.after_request
+    def report_sql_profile(response):
+        profile = g.get('sql_profile')
+        if profile is None:
+            return response
+        db_time_ms = profile['time'] * 1000
+        response.headers.add(
+            'Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(db_time_ms, profile['count'])
+        )
+        slow_query_s = app.config['SQL_SLOW_QUERY_MS'] / 1000
+        for duration, statement in profile['slowest']:
+            if duration >= slow_query_s:
+                logger.warning(json.dumps({
+                    'event': 'slow_query', 'endpoint': request.endpoint, 'duration_ms': round(duration * 1000, 2),
+                    'statement': statement,
+                }))
+        logger.info(json.dumps({
+            'event': 'request_sql_profile',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'query_count': profile['count'],
+            'db_time_ms': round(db_time_ms, 2),
+            'slowest': [{'duration_ms': round(duration * 1000, 2), 'statement': statement}
+                        for duration, statement in profile['slowest']],
+        }))
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', app.config['SQL_QUERY_BUDGET'])
+        if budget is not None and profile['count'] > budget:
+            message = '{} ran {} SQL queries, budget is {}'.format(request.endpoint, profile['count'], budget)
+            logger.warning(json.dumps({'event': 'query_budget_exceeded', 'endpoint': request.endpoint,
+                                       'query_count': profile['count'], 'budget': budget}))
+            if app.config.get('SQL_QUERY_BUDGET_STRICT', app.testing):
+                raise QueryBudgetExceeded(message)
+        return response
@@ -0,0 +1,221 @@
+from collections import defaultdict
+from flask import request, abort
+from sqlalchemy import select, func, literal_column, type_coerce
+from models import db, Game, User, Match, MatchParticipants, Tournament, TournamentParticipants, TournamentStanding
+
+# Read path of listing endpoints: queries select just the columns of the short view and return plain rows, skipping
+# ORM entities (identity map, instrumentation). Writes and single resource views keep using the models.
+# Listings are compact: matches and tournaments carry their participant_count, participants are embedded only on
+# request (?expand=participants).
+
+
+def expand_arg(allowed):
+    """
+    expand_arg(allowed)
+        sub-resources to embed, from the comma separated 'expand' arg. Abort with 400 on values not in allowed
+    """
+    expand = sorted(set(value for value in request.args.get('expand', '', str).split(',') if value))
+    if any(value not in allowed for value in expand):
+        abort(400, 'expand values must be in: {}'.format(', '.join(allowed)))
+    return expand
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def json_object_array(**fields):
+    """
+    json_object_array(**fields)
+        aggregate building a JSON array of {field: column} objects, None when the database has no JSON aggregate
+    """
+    pairs = []
+    for key, column in fields.items():
+        pairs += [db.literal(key, db.String), column]
+    name = dialect_name()
+    if name == 'postgresql':
+        return func.coalesce(func.json_agg(func.json_build_object(*pairs)), literal_column("'[]'::json"))
+    if name == 'sqlite':
+        return func.json_group_array(func.json_object(*pairs))
+    return None
+
+
+def participants_column(parent_key, parent_id):
+    """
+    participants_column(parent_key, parent_id)
+        correlated subquery of the participants ({id, name}) of each parent row as a JSON array, joining on
+        parent_key (i.e. MatchParticipants.match_id) = parent_id. None when the database can't aggregate it (see
+        with_participants)
+    """
+    aggregate = json_object_array(id=User.id, name=User.name)
+    if aggregate is None:
+        return None
+    participations = parent_key.class_
+    subquery = select([aggregate]) \
+        .select_from(participations.__table__.join(User.__table__, User.id == participations.user_id)) \
+        .where(parent_key == parent_id) \
+        .as_scalar()
+    return type_coerce(subquery, db.JSON).label('participants')
+
+
+def with_participants(items, parent_key):
+    """
+    with_participants(items, parent_key)
+        fill the participants of item dicts not aggregated by the query, with a single batched query
+    """
+    missing = [item for item in items if 'participants' in item and item['participants'] is None]
+    if not missing:
+        return items
+    participations = parent_key.class_
+    participants = defaultdict(list)
+    rows = db.session.query(parent_key, User.id, User.name) \
+        .join(User, User.id == participations.user_id) \
+        .filter(parent_key.in_([item['id'] for item in missing])) \
+        .order_by(participations.id)
+    for parent_id, user_id, user_name in rows:
+        participants[parent_id].append({'id': user_id, 'name': user_name})
+    for item in missing:
+        item['participants'] = participants[item['id']]
+    return items
+
+
+def game_short_query():
+    return db.session.query(Game.id, Game.name)
+
+
+def user_short_query():
+    return db.session.query(User.id, User.name)
+
+
+def name_short(row):
+    """
+    name_short(row)
+        Game.short() / User.short() dict of game_short_query() / user_short_query() rows
+    """
+    return {
+        'id': row.id,
+        'name': row.name,
+    }
+
+
+def match_short_query(participants=False):
+    columns = [
+        Match.id, Match.uuid, Match.name, Match.game_id, Game.name.label('game_name'), Match.max_participants,
+        Match.participant_count, Match.created_at, Match.updated_at,
+    ]
+    participants = participants_column(MatchParticipants.match_id, Match.id) if participants else None
+    if participants is not None:
+        columns.append(participants)
+    return db.session.query(*columns).select_from(Match).outerjoin(Game, Game.id == Match.game_id)
+
+
+def match_shorts(rows, participants=False):
+    """
+    match_shorts(rows, participants)
+        compact Match.short() dicts of match_short_query() rows, with the participants list if participants
+    """
+    items = []
+    for row in rows:
+        item = {
+            'id': row.id,
+            'uuid': row.uuid,
+            'name': row.name,
+            'game_id': row.game_id,
+            'game': {'id': row.game_id, 'name': row.game_name} if row.game_name is not None else None,
+            'max_participants': row.max_participants,
+            'participant_count': row.participant_count,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at,
+        }
+        if participants:
+            item['participants'] = getattr(row, 'participants', None)
+        items.append(item)
+    return with_participants(items, MatchParticipants.match_id)
+
+
+def tournament_short_query(participants=False):
+    columns = [
+        Tournament.id, Tournament.uuid, Tournament.name, Tournament.game_id, Game.name.label('game_name'),
+        Tournament.creator_id, Tournament.max_participants, Tournament.participant_count, Tournament.start_date,
+        Tournament.start_date_tz,
+    ]
+    participants = participants_column(TournamentParticipants.tournament_id, Tournament.id) if participants else None
+    if participants is not None:
+        columns.append(participants)
+    return db.session.query(*columns).select_from(Tournament).outerjoin(Game, Game.id == Tournament.game_id)
+
+
+def tournament_shorts(rows, participants=False):
+    """
+    tournament_shorts(rows, participants)
+        compact Tournament.short() dicts of tournament_short_query() rows, with the participants list if participants
+    """
+    items = []
+    for row in rows:
+        item = {
+            'id': row.id,
+            'uuid': row.uuid,
+            'name': row.name,
+            'game_id': row.game_id,
+            'game': {'id': row.game_id, 'name': row.game_name} if row.game_name is not None else None,
+            'creator_id': row.creator_id,
+            'max_participants': row.max_participants,
+            'participant_count': row.participant_count,
+            'start_date': row.start_date,
+            'start_date_tz': row.start_date_tz,
+        }
+        if participants:
+            item['participants'] = getattr(row, 'participants', None)
+        items.append(item)
+    return with_participants(items, TournamentParticipants.tournament_id)
+
+
+def bracket(tournament_id):
+    """
+    bracket(tournament_id)
+        bracket matches of a tournament grouped by bracket and round, with their players by slot, in 2 queries
+    """
+    matches = db.session.query(
+        Match.id, Match.uuid, Match.bracket, Match.round, Match.position, Match.winner_id,
+    ).filter(Match.tournament_id == tournament_id, Match.bracket != None) \
+        .order_by(Match.bracket, Match.round, Match.position).all()
+    players = defaultdict(lambda: [None, None])
+    rows = db.session.query(MatchParticipants.match_id, MatchParticipants.slot, User.id, User.name) \
+        .join(Match, Match.id == MatchParticipants.match_id) \
+        .join(User, User.id == MatchParticipants.user_id) \
+        .filter(Match.tournament_id == tournament_id, Match.bracket != None, MatchParticipants.slot != None)
+    for match_id, slot, user_id, user_name in rows:
+        players[match_id][slot] = {'id': user_id, 'name': user_name}
+    rounds = defaultdict(lambda: defaultdict(list))
+    for match in matches:
+        rounds[match.bracket][match.round].append({
+            'id': match.id,
+            'uuid': match.uuid,
+            'position': match.position,
+            'players': players[match.id],
+            'winner_id': match.winner_id,
+        })
+    return {
+        name: [{'round': round, 'matches': round_matches} for round, round_matches in sorted(bracket_rounds.items())]
+        for name, bracket_rounds in rounds.items()
+    }
+
+
+def standings(tournament_id):
+    """
+    standings(tournament_id)
+        tournament standings, players still in the running first, then by wins and losses
+    """
+    rows = db.session.query(
+        TournamentStanding.played, TournamentStanding.wins, TournamentStanding.losses, TournamentStanding.eliminated,
+        User.id, User.name,
+    ).join(User, User.id == TournamentStanding.user_id) \
+        .filter(TournamentStanding.tournament_id == tournament_id) \
+        .order_by(TournamentStanding.eliminated, TournamentStanding.wins.desc(), TournamentStanding.losses, User.id)
+    return [{
+        'user': {'id': row.id, 'name': row.name},
+        'played': row.played,
+        'wins': row.wins,
+        'losses': row.losses,
+        'eliminated': row.eliminated,
+    } for row in rows]
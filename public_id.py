@@ -0,0 +1,52 @@
+import os
+import random
+import threading
+import time
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+TIMESTAMP_BITS = 42
+SEQUENCE_BITS = 12
+NODE_BITS = 24
+ID_LENGTH = 14  # Base62 chars needed for 78 bits
+
+_lock = threading.Lock()
+_pid = None
+_node = 0
+_last_ms = 0
+_sequence = 0
+
+
+def generate_public_id(prefix):
+    """
+    generate_public_id(prefix)
+        return prefix followed by a time ordered Base62 id, generated without any database lookup.
+        The id packs the millisecond timestamp, a per process sequence and a random node id drawn once per process.
+        Ids of a process never repeat; two processes only clash if they drew the same node id (1 in 2^24) and generate
+        in the same millisecond with the same sequence, so inserts retry on a uuid clash (see models.py)
+    """
+    global _pid, _node, _last_ms, _sequence
+    with _lock:
+        if _pid != os.getpid():
+            # New process (i.e. forked worker): draw its own node id
+            _pid = os.getpid()
+            _node = random.SystemRandom().getrandbits(NODE_BITS)
+        now_ms = max(int(time.time() * 1000), _last_ms)
+        if now_ms == _last_ms:
+            _sequence = (_sequence + 1) % (1 << SEQUENCE_BITS)
+            if _sequence == 0:
+                # Sequence exhausted for this millisecond, wait for the next one
+                while now_ms <= _last_ms:
+                    now_ms = int(time.time() * 1000)
+        else:
+            _sequence = 0
+        _last_ms = now_ms
+        value = (((now_ms % (1 << TIMESTAMP_BITS)) << SEQUENCE_BITS | _sequence) << NODE_BITS) | _node
+    return prefix + base62_encode(value, ID_LENGTH)
+
+
+def base62_encode(value, length):
+    chars = []
+    while value:
+        value, remainder = divmod(value, 62)
+        chars.append(BASE62[remainder])
+    return ''.join(reversed(chars)).rjust(length, BASE62[0])
@@ -1,3 +1,4 @@
 from routes.match import match_blueprint
 from routes.tournament import tournament_blueprint
 from routes.game import game_blueprint
+from routes.internal import internal_blueprint
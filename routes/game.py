@@ -1,20 +1,51 @@
-from flask import Blueprint, request, jsonify, redirect, Response
+from flask import Blueprint, request, redirect, Response
+from sqlalchemy import event
 from models import db, Match, Tournament, User, Game
-import random
+import os
 import auth
+import errors
+import projections
+from cache import make_cache
+from http_cache import cached_json_view
+from json_provider import jsonify
+from pagination import paginate
+from search import search_filter
 
 game_blueprint = Blueprint('game', __name__)
 
+# Serialized game catalog responses, cleared whenever a game is written. Without CACHE_REDIS_URL the cache is per
+# process, so the clear only reaches the worker doing the write: other workers serve their entries until they expire
+GAME_CACHE = make_cache('games', maxsize=int(os.environ.get('GAME_CACHE_SIZE', 1024)), local_ttl=5)
+GAME_CACHE_TTL = float(os.environ.get('GAME_CACHE_TTL', 30))
+# Cached views read from the primary: a lagging replica would refill the cache with the catalog before the write
+
+
+@event.listens_for(Game, 'after_insert')
+@event.listens_for(Game, 'after_update')
+@event.listens_for(Game, 'after_delete')
+def mark_games_changed(mapper, connection, game):
+    db.session.info['games_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def clear_game_cache(session):
+    # Games may also be created by match and tournament endpoints, so the cache is cleared on any commit writing them
+    if session.info.pop('games_changed', False):
+        GAME_CACHE.clear()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_games_changed(session):
+    session.info.pop('games_changed', None)
+
 
 @game_blueprint.route('/games')
+@cached_json_view(GAME_CACHE, ttl=GAME_CACHE_TTL)
 def get_games():
-    max_per_page = 100
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('perPage', 50, type=int)
-    q = db.session.query(Game)
+    q = projections.game_short_query()
     search_term = request.args.get('searchTerm', None, str)
     if search_term:
-        q = q.filter((Game.name.ilike('%{}%'.format(search_term))))  # Filter by term
+        q = q.filter(search_filter(search_term, Game.name))  # Filter by term
     order_by_str = request.args.get('orderBy', '', str)
     if order_by_str:
         order_by_values = order_by_str.split(',')
@@ -35,16 +66,11 @@ def get_games():
     else:
         print('ads')
         q = q.order_by(Game.name.asc())
-    pagination = q.paginate(page, per_page, max_per_page)  # Paginate result
-    return_games = []
-    for game in pagination.items:
-        return_games.append(game.short())
+    games, page_info = paginate(q, 'games', (Game.name, Game.id), 50, 100)  # Paginate result
     return_data = {
-        'games': return_games,
-        'total_games': pagination.total,
-        'page': pagination.page,
-        'pages': pagination.pages,
+        'games': [projections.name_short(game) for game in games],
     }
+    return_data.update(page_info)
     return jsonify(return_data)
 
 
@@ -65,10 +91,11 @@ def create_game():
 
 
 @game_blueprint.route('/games/<int:game_id>')
+@cached_json_view(GAME_CACHE, ttl=GAME_CACHE_TTL)
 def get_game(game_id):
     game = db.session.query(Game).filter(Game.id == game_id).first()
     if not game:
-        return {'error': 'Game not found'}, 404
+        return errors.not_found_error('Game not found')
     return jsonify(game.long())
 
 
@@ -93,13 +120,3 @@ def delete_game(game_id):
         return {'error': 'Game not found'}, 404
     game.delete()
     return '', 204
-
-
-def generate_uuid(length):
-    """
-    Generate a uuid starting with 'm'
-    :param length: Length of UUID plus a starting 'm'
-    :return string: A string starting with 'm' plus length - 1 random chars (Base62)
-    """
-    chars = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-    return 'm' + ''.join(random.choices(chars, k=length - 1))
@@ -0,0 +1,17 @@
+from flask import Blueprint, current_app
+from models import db
+from db_metrics import pool_status
+from db_routing import replica_binds
+from json_provider import jsonify
+import auth
+
+internal_blueprint = Blueprint('internal', __name__)
+
+
+@internal_blueprint.route('/internal/db-pool')
+@auth.requires_auth('read:metrics')
+def get_db_pool(payload):
+    pools = {'primary': pool_status(db.engine)}
+    for bind in replica_binds(current_app):
+        pools[bind] = pool_status(db.get_engine(current_app, bind=bind))
+    return jsonify(pools)
@@ -1,38 +1,39 @@
-from flask import Blueprint, request, jsonify
-from models import db, Match, Tournament, User, Game, MatchParticipants
-import random
+from flask import Blueprint, request, Response, current_app
+from models import db, Match, User, Game
 import auth
 import errors
+import live
+import projections
+from db_routing import use_replica
+from http_cache import versioned_response, version_etag
+from json_provider import jsonify
+from pagination import paginate
+from search import search_filter
 
 match_blueprint = Blueprint('match', __name__)
 
 
 @match_blueprint.route('/matches')
+@use_replica
 def get_matches():
-    max_per_page = 50
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('perPage', 20, type=int)
-    q = db.session.query(Match)
+    # Participants are only counted, unless embedded with ?expand=participants
+    expand = projections.expand_arg(('participants',))
+    # Games are joined once, both to search by game name and to project each match game
+    q = projections.match_short_query(participants='participants' in expand)
     search_term = request.args.get('searchTerm', None, str)
     if search_term:
-        q = q.filter((Match.name.ilike('%{}%'.format(search_term)))
-                     | (Match.game.name.ilike('%{}%'.format(search_term))))  # Filter by term
+        q = q.filter(search_filter(search_term, Match.name, Game.name))  # Filter by term
+    if request.args.get('hasFreeSlots', 0, int):
+        q = q.filter(Match.free_slots_filter())
     # Retrieve logged user and filter by private matches and by user owned matches
-    logged_user =auth.get_logged_user()
-    if logged_user:
-        q = q.filter((Match.is_private == False) | (Match.creator_id == logged_user.id))
-    else:
-        q = q.filter((Match.is_private == False))
-    pagination = q.paginate(page, per_page, max_per_page)  # Paginate result
-    return_matches = []
-    for match in pagination.items:
-        return_matches.append(match.short())
+    logged_user = auth.get_logged_user()
+    q = q.filter(Match.visible_to(logged_user))
+    # Newest matches first when paginating by cursor
+    matches, page_info = paginate(q, 'matches', (Match.created_at, Match.id), 20, 50, descending=True)
     return_data = {
-        'matches': return_matches,
-        'total_matches': pagination.total,
-        'page': pagination.page,
-        'pages': pagination.pages,
+        'matches': projections.match_shorts(matches, participants='participants' in expand),
     }
+    return_data.update(page_info)
     return jsonify(return_data)
 
 
@@ -50,19 +51,6 @@ def create_match(payload):
         db.session.add(game)
 
     match = Match(name=data)
-    uuid_len = 6
-    tries = 0
-    max_tries = 10
-    match_found = True
-    uuid = ''
-    while (match_found):
-        if tries >= max_tries:
-            tries = 0
-            uuid_len += 1
-        tries += 1
-        uuid = generate_uuid(uuid_len)
-        match_found = db.session.query(Match).filter(Match.uuid == uuid).first()
-    match.uuid = uuid
     match.name = data['name']
     match.max_participants = data['maxParticipants'] if 'maxParticipants' in data else 2
     match.game_id = game.id
@@ -72,18 +60,47 @@ def create_match(payload):
         match.is_private = False
     user = auth.get_logged_user()
     match.creator_id = user.id
+    match.participant_count = 1
+    match.add_with_public_id('m')
     user.matches.append(match)
-    db.session.add(match)
     db.session.commit()
     return jsonify(match.long()), 201
 
 
+@match_blueprint.route('/matches/matchmaking', methods=['POST'])
+@auth.requires_auth()
+def matchmaking(payload):
+    # Put the logged user in the oldest public match of the game with a free slot, or in a new one
+    data = request.json or {}
+    if 'gameId' not in data:
+        return errors.bad_request_error('Passed data must contain "gameId" value')
+    max_participants = data.get('maxParticipants')
+    if max_participants is not None and (not isinstance(max_participants, int) or max_participants < 2):
+        return errors.bad_request_error('"maxParticipants" must be an integer greater than 1')
+    game = Game.query.filter(Game.id == data['gameId']).first()
+    if not game:
+        return errors.not_found_error('Game not found')
+    logged_user = auth.get_logged_user()
+    match, outcome = Match.matchmake(game, logged_user.id, max_participants)
+    db.session.commit()
+    if outcome == Match.JOINED:
+        live.publish_match_event(match.id, 'participant_joined', user=logged_user.short(),
+                                 participant_count=match.participant_count)
+    return jsonify(match.long()), 201 if outcome == Match.CREATED else 200
+
+
 @match_blueprint.route('/matches/<string:match_uuid>')
+@use_replica
 def get_match(match_uuid):
-    match = db.session.query(Match).filter(Match.uuid == match_uuid).first()
-    if not match:
+    # Look up the match version first, so clients polling an unchanged match get a 304 without loading it
+    version = db.session.query(Match.id, Match.updated_at).filter(Match.uuid == match_uuid).first()
+    if not version:
         return errors.not_found_error('Match not found')
-    return jsonify(match.long())
+
+    def match_response():
+        match = db.session.query(Match).options(*Match.view_options('long')).filter(Match.id == version.id).first()
+        return jsonify(match.long())
+    return versioned_response(version_etag(version.id, version.updated_at), version.updated_at, match_response)
 
 
 @match_blueprint.route('/matches/<int:match_id>', methods=['PATCH'])
@@ -97,40 +114,43 @@ def patch_match(payload, match_id):
     match = db.session.query(Match).filter(Match.id == match_id).first()
     if not match:
         return errors.not_found_error('Match not found')
+    if match.bracket is not None and (action in ('join', 'disjoin') or 'join' in data or 'remove' in data):
+        return errors.bad_request_error('Players of tournament bracket matches are set by the bracket')
 
     logged_user = auth.get_logged_user()
     if action == 'join':
-        if len(match.participants) < match.max_participants:
-            for participant in match.participants:
-                if participant.id == logged_user.id:
-                    return errors.bad_request_error('You can\'t join an already joined match')
-            match.participants.append(logged_user)
-            match.update()
-            return '', 204
-        else:
+        # Capacity check and insert are done atomically by the database
+        joined = match.join(logged_user.id)
+        if joined == Match.FULL:
             return errors.bad_request_error('You can\'t join on a full match')
+        if joined == Match.ALREADY_JOINED:
+            return errors.bad_request_error('You can\'t join an already joined match')
+        db.session.commit()
+        live.publish_match_event(match.id, 'participant_joined', user=logged_user.short(),
+                                 participant_count=match.participant_count)
+        return '', 204
     elif action == 'disjoin':
-        MatchParticipants.query.filter((MatchParticipants.match_id == match_id) & (MatchParticipants.user_id == logged_user.id)).delete()
+        removed = match.remove_participants([logged_user.id])
         db.session.commit()
+        if removed:
+            live.publish_match_event(match.id, 'participant_left', user=logged_user.short(),
+                                     participant_count=match.participant_count)
         return '', 204
     elif action == 'edit':
         if match.creator_id != logged_user.id:
             return errors.forbidden_error('You can edit only you\'re matches')
+        for field in ('join', 'remove'):
+            if field in data and not Match.is_user_id_list(data[field]):
+                return errors.bad_request_error('"{}" must be a list of user ids'.format(field))
         if 'maxParticipants' in data:
             match.max_participants = data['maxParticipants']
         if 'name' in data:
             match.name = data['name']
         if 'isPrivate' in data:
             match.is_private = data['isPrivate']
-        if 'join' in data:
-            for user_id in data['join']:
-                user = User.query.filter(User.id == user_id).first()
-                if user:
-                    match.participants.append(user)
-        if 'remove' in data:
-            match.participants.filter(User.id.in_(data['remove'])).clear()
-            MatchParticipants.query.filter(
-                (MatchParticipants.match_id == match_id) & (MatchParticipants.user_id.in_(data['remove']))).delete()
+        participants_report = None
+        if 'join' in data or 'remove' in data:
+            participants_report = match.update_participants(data.get('join', []), data.get('remove', []))
         if 'gameId' in data:
             print('gameId is', data['gameId'])
             if data['gameId'] is None:
@@ -150,10 +170,56 @@ def patch_match(payload, match_id):
                 else:
                     match.game_id = game.id
         db.session.commit()
-        return jsonify(match.long())
+        live.publish_match_event(match.id, 'match_updated', changes=sorted(key for key in data if key != 'action'),
+                                 participants_report=participants_report, participant_count=match.participant_count)
+        return_data = match.long()
+        if participants_report:
+            return_data['participants_report'] = participants_report
+        return jsonify(return_data)
     return errors.bad_request_error('"{}" action is not supported'.format(action))
 
 
+@match_blueprint.route('/matches/<int:match_id>/participants', methods=['POST'])
+@auth.requires_auth()
+def update_match_participants(payload, match_id):
+    data = request.json
+    if not isinstance(data, dict) or not ('add' in data or 'remove' in data):
+        return errors.bad_request_error('Passed data must contain "add" and/or "remove" user id lists')
+    for field in ('add', 'remove'):
+        if field in data and not Match.is_user_id_list(data[field]):
+            return errors.bad_request_error('"{}" must be a list of user ids'.format(field))
+    match = db.session.query(Match).filter(Match.id == match_id).first()
+    if not match:
+        return errors.not_found_error('Match not found')
+    if match.bracket is not None:
+        return errors.bad_request_error('Players of tournament bracket matches are set by the bracket')
+    logged_user = auth.get_logged_user()
+    if match.creator_id != logged_user.id:
+        return errors.forbidden_error('You can edit only you\'re matches')
+    report = match.update_participants(data.get('add', []), data.get('remove', []))
+    db.session.commit()
+    report['participant_count'] = match.participant_count
+    live.publish_match_event(match.id, 'participants_changed', participants_report=report,
+                             participant_count=match.participant_count)
+    return jsonify(report)
+
+
+@match_blueprint.route('/matches/<string:match_uuid>/events')
+@use_replica
+def match_events(match_uuid):
+    match_id = db.session.query(Match.id).filter(Match.uuid == match_uuid).scalar()
+    if not match_id:
+        return errors.not_found_error('Match not found')
+    # Subscribe before answering so no event is lost, and give the DB connection back: the stream is long lived
+    subscription = current_app.extensions['live_broker'].subscribe(live.match_channel(match_id))
+    db.session.close()
+    stream = live.event_stream(subscription, current_app.config['LIVE_KEEPALIVE_SECONDS'])
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Don't let proxies buffer the stream
+    })
+
+
 @auth.requires_auth('delete:match')
 @match_blueprint.route('/matches/<int:match_id>', methods=['DELETE'])
 def delete_match(match_id):
@@ -164,6 +230,7 @@ def delete_match(match_id):
     if match.creator_id != logged_user.id:
         return errors.forbidden_error('You can\'t delete a not your own match')
     match.delete()
+    live.publish_match_event(match_id, 'match_deleted')
     return '', 204
 
 
@@ -174,39 +241,27 @@ def delete_any_match(match_id):
     if not match:
         return errors.not_found_error('Match not found')
     match.delete()
+    live.publish_match_event(match_id, 'match_deleted')
     return '', 204
 
 
 @match_blueprint.route('/matches/<int:match_id>/users')
+@use_replica
 def match_users(match_id):
-    match = db.session.query(Match).filter(Match.id == match_id).first()
-    if not match:
+    if not db.session.query(Match.id).filter(Match.id == match_id).scalar():
         return errors.not_found_error('Match not found')
-    max_per_page = 50
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('perPage', 20, type=int)
-    q = db.session.query(User)
+    q = projections.user_short_query()
     search_term = request.args.get('searchTerm', None, str)
     if search_term:
-        q = q.filter((User.name.ilike('%{}%'.format(search_term))))  # Filter by term
+        q = q.filter(search_filter(search_term, User.name))  # Filter by term
     user_joined = request.args.get('joined', 1, int)
     if user_joined:
         q = q.filter(User.matches.any(Match.id == match_id))
     else:
         q = q.filter(~ (User.matches.any(Match.id == match_id)))
-    pagination = q.paginate(page, per_page, max_per_page)  # Paginate result
-    return_users = []
-    for user in pagination.items:
-        return_users.append(user.short())
+    users, page_info = paginate(q, 'users', (User.name, User.id), 20, 50)  # Paginate result
     return_data = {
-        'users': return_users,
-        'total_users': pagination.total,
-        'page': pagination.page,
-        'pages': pagination.pages,
+        'users': [projections.name_short(user) for user in users],
     }
+    return_data.update(page_info)
     return jsonify(return_data)
-
-
-def generate_uuid(length):
-    chars = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-    return 'm' + ''.join(random.choices(chars, k=length))
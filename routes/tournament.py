@@ -1,38 +1,262 @@
-from flask import Blueprint, request, jsonify
-from models import db, Tournament, User, Game
-import random
+from flask import Blueprint, request
+from sqlalchemy import func
+from models import db, Tournament, TournamentParticipants, Match, User, Game
 import auth
+import brackets
 import errors
+import projections
+from db_routing import use_replica
+from http_cache import versioned_response, version_etag
+from json_provider import jsonify
+from pagination import paginate
+from search import search_filter
 
 tournament_blueprint = Blueprint('tournament', __name__)
 
 
 @tournament_blueprint.route('/tournaments')
+@use_replica
 def get_games():
-    # Get pagination data
-    max_per_page = 100
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('perPage', 50, type=int)
-    q = db.session.query(Tournament)
+    # Participants are only counted, unless embedded with ?expand=participants
+    expand = projections.expand_arg(('participants',))
+    q = projections.tournament_short_query(participants='participants' in expand)
     # Get filter term
     search_term = request.args.get('searchTerm', None, str)
     if search_term:
-        q = q.filter((Tournament.name.ilike('%{}%'.format(search_term))))  # Filter by term
+        q = q.filter(search_filter(search_term, Tournament.name))  # Filter by term
+    if request.args.get('hasFreeSlots', 0, int):
+        q = q.filter(Tournament.free_slots_filter())  # Open to registrations, with free slots
     q = q.order_by(Tournament.name.asc())
-    pagination = q.paginate(page, per_page, max_per_page)  # Paginate result
-    return_tournaments = []
-    for tournament in pagination.items:
-        return_tournaments.append(tournament.short())
+    tournaments, page_info = paginate(q, 'tournaments', (Tournament.name, Tournament.id), 50, 100)
     # Return data and pagination info
     return_data = {
-        'tournaments': return_tournaments,
-        'total_tournaments': pagination.total,
-        'page': pagination.page,
-        'pages': pagination.pages,
+        'tournaments': projections.tournament_shorts(tournaments, participants='participants' in expand),
     }
+    return_data.update(page_info)
     return jsonify(return_data)
 
 
+EXPANDABLE = ('matches', 'participants')
+
+
+def tournament_matches_query(tournament_id, participants=False):
+    return projections.match_short_query(participants) \
+        .filter(Match.tournament_id == tournament_id, Match.visible_to(auth.get_logged_user()))
+
+
+def tournament_participants_query(tournament_id):
+    return projections.user_short_query() \
+        .join(TournamentParticipants, TournamentParticipants.user_id == User.id) \
+        .filter(TournamentParticipants.tournament_id == tournament_id)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>')
+@use_replica
+def get_tournament(tournament_uuid):
+    # Matches and participants are only counted, unless embedded with i.e. ?expand=matches,participants
+    expand = projections.expand_arg(EXPANDABLE)
+    # Look up the tournament version first, so unchanged tournaments get a 304 without being loaded
+    version = db.session.query(Tournament.id, Tournament.updated_at).filter(Tournament.uuid == tournament_uuid).first()
+    if not version:
+        return errors.not_found_error('Tournament not found')
+    etag, last_modified = version_etag(version.id, version.updated_at), version.updated_at
+    if 'matches' in expand:
+        # Embedded matches change without touching the tournament row
+        matches_updated_at = db.session.query(func.max(Match.updated_at)) \
+            .filter(Match.tournament_id == version.id).scalar()
+        if matches_updated_at and (not last_modified or matches_updated_at > last_modified):
+            last_modified = matches_updated_at
+        etag = '{}-{}'.format(version_etag(version.id, last_modified), '+'.join(expand))
+    elif expand:
+        etag = '{}-{}'.format(etag, '+'.join(expand))
+
+    def tournament_response():
+        tournament = db.session.query(Tournament).options(*Tournament.view_options('long')) \
+            .filter(Tournament.id == version.id).first()
+        return_data = tournament.long()
+        if 'matches' in expand:
+            matches = tournament_matches_query(version.id).order_by(Match.created_at, Match.id).all()
+            return_data['matches'] = projections.match_shorts(matches)
+        if 'participants' in expand:
+            participants = tournament_participants_query(version.id).order_by(User.name, User.id)
+            return_data['participants'] = [projections.name_short(participant) for participant in participants]
+        return jsonify(return_data)
+    response = versioned_response(etag, last_modified, tournament_response)
+    if 'matches' in expand:
+        response.headers['Cache-Control'] = 'private, no-cache'  # Embedded matches depend on the logged user
+    return response
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/matches')
+@use_replica
+def get_tournament_matches(tournament_uuid):
+    tournament_id = db.session.query(Tournament.id).filter(Tournament.uuid == tournament_uuid).scalar()
+    if not tournament_id:
+        return errors.not_found_error('Tournament not found')
+    expand = projections.expand_arg(('participants',))
+    q = tournament_matches_query(tournament_id, participants='participants' in expand)
+    if request.args.get('hasFreeSlots', 0, int):
+        q = q.filter(Match.free_slots_filter())
+    matches, page_info = paginate(q.order_by(Match.created_at, Match.id), 'matches', (Match.created_at, Match.id), 50, 100)
+    return_data = {
+        'matches': projections.match_shorts(matches, participants='participants' in expand),
+    }
+    return_data.update(page_info)
+    return jsonify(return_data)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/participants')
+@use_replica
+def get_tournament_participants(tournament_uuid):
+    tournament_id = db.session.query(Tournament.id).filter(Tournament.uuid == tournament_uuid).scalar()
+    if not tournament_id:
+        return errors.not_found_error('Tournament not found')
+    q = tournament_participants_query(tournament_id)
+    search_term = request.args.get('searchTerm', None, str)
+    if search_term:
+        q = q.filter(search_filter(search_term, User.name))  # Filter by term
+    participants, page_info = paginate(q.order_by(User.name, User.id), 'participants', (User.name, User.id), 50, 100)
+    return_data = {
+        'participants': [projections.name_short(participant) for participant in participants],
+    }
+    return_data.update(page_info)
+    return jsonify(return_data)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/join', methods=['POST'])
+@auth.requires_auth()
+def join_tournament(payload, tournament_uuid):
+    tournament = db.session.query(Tournament).filter(Tournament.uuid == tournament_uuid).first()
+    if not tournament:
+        return errors.not_found_error('Tournament not found')
+    logged_user = auth.get_logged_user()
+    # Capacity check and insert are done atomically by the database
+    joined = tournament.join(logged_user.id)
+    if joined == Tournament.FULL:
+        return errors.bad_request_error('You can\'t join on a full tournament')
+    if joined == Tournament.ALREADY_JOINED:
+        return errors.bad_request_error('You can\'t join an already joined tournament')
+    if joined == Tournament.CLOSED:
+        return errors.bad_request_error('Tournament registrations are closed')
+    db.session.commit()
+    return '', 204
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/leave', methods=['POST'])
+@auth.requires_auth()
+def leave_tournament(payload, tournament_uuid):
+    tournament = db.session.query(Tournament).filter(Tournament.uuid == tournament_uuid).first()
+    if not tournament:
+        return errors.not_found_error('Tournament not found')
+    logged_user = auth.get_logged_user()
+    if not tournament.remove_participants([logged_user.id]) and not tournament.is_open():
+        return errors.bad_request_error('Tournament registrations are closed')
+    db.session.commit()
+    return '', 204
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/participants', methods=['POST'])
+@auth.requires_auth()
+def update_tournament_participants(payload, tournament_uuid):
+    data = request.json
+    if not isinstance(data, dict) or not ('add' in data or 'remove' in data):
+        return errors.bad_request_error('Passed data must contain "add" and/or "remove" user id lists')
+    for field in ('add', 'remove'):
+        if field in data and not Tournament.is_user_id_list(data[field]):
+            return errors.bad_request_error('"{}" must be a list of user ids'.format(field))
+    tournament = db.session.query(Tournament).filter(Tournament.uuid == tournament_uuid).first()
+    if not tournament:
+        return errors.not_found_error('Tournament not found')
+    logged_user = auth.get_logged_user()
+    if tournament.creator_id != logged_user.id:
+        return errors.forbidden_error('You can edit only you\'re tournaments')
+    if not tournament.is_open():
+        return errors.bad_request_error('Tournament registrations are closed')
+    report = tournament.update_participants(data.get('add', []), data.get('remove', []))
+    db.session.commit()
+    report['participant_count'] = tournament.participant_count
+    return jsonify(report)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/bracket')
+@use_replica
+def get_bracket(tournament_uuid):
+    version = db.session.query(Tournament.id, Tournament.format, Tournament.updated_at) \
+        .filter(Tournament.uuid == tournament_uuid).first()
+    if not version:
+        return errors.not_found_error('Tournament not found')
+
+    def bracket_response():
+        return jsonify({
+            'tournament_id': version.id,
+            'format': version.format,
+            'brackets': projections.bracket(version.id),
+        })
+    return versioned_response(version_etag(version.id, version.updated_at), version.updated_at, bracket_response)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/standings')
+@use_replica
+def get_standings(tournament_uuid):
+    version = db.session.query(Tournament.id, Tournament.format, Tournament.updated_at) \
+        .filter(Tournament.uuid == tournament_uuid).first()
+    if not version:
+        return errors.not_found_error('Tournament not found')
+
+    def standings_response():
+        return jsonify({
+            'tournament_id': version.id,
+            'format': version.format,
+            'standings': projections.standings(version.id),
+        })
+    return versioned_response(version_etag(version.id, version.updated_at), version.updated_at, standings_response)
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/bracket', methods=['POST'])
+@auth.requires_auth()
+def generate_bracket(payload, tournament_uuid):
+    tournament = db.session.query(Tournament).filter(Tournament.uuid == tournament_uuid).first()
+    if not tournament:
+        return errors.not_found_error('Tournament not found')
+    logged_user = auth.get_logged_user()
+    if tournament.creator_id != logged_user.id:
+        return errors.forbidden_error('You can\'t generate the bracket of a not your tournament')
+    data = request.get_json(silent=True) or {}
+    try:
+        matches_count = tournament.generate_bracket(data.get('format', brackets.SINGLE_ELIMINATION))
+    except brackets.BracketError as ex:
+        db.session.rollback()
+        return errors.bad_request_error(str(ex))
+    db.session.commit()
+    return jsonify({
+        'tournament_id': tournament.id,
+        'format': tournament.format,
+        'matches': matches_count,
+        'brackets': projections.bracket(tournament.id),
+    }), 201
+
+
+@tournament_blueprint.route('/tournaments/<string:tournament_uuid>/matches/<int:match_id>/result', methods=['POST'])
+@auth.requires_auth()
+def record_match_result(payload, tournament_uuid, match_id):
+    tournament = db.session.query(Tournament).filter(Tournament.uuid == tournament_uuid).first()
+    if not tournament:
+        return errors.not_found_error('Tournament not found')
+    logged_user = auth.get_logged_user()
+    if tournament.creator_id != logged_user.id:
+        return errors.forbidden_error('You can\'t record results of a not your tournament')
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('winnerId'), int):
+        return errors.bad_request_error('winnerId must be a user id')
+    try:
+        result = tournament.record_result(match_id, data['winnerId'])
+    except brackets.BracketError as ex:
+        db.session.rollback()
+        return errors.bad_request_error(str(ex))
+    db.session.commit()
+    return jsonify(result)
+
+
 @tournament_blueprint.route('/tournaments', methods=['POST'])
 @auth.requires_auth('create:tournament')
 def create_tournament(payload):
@@ -48,20 +272,6 @@ def create_tournament(payload):
         db.session.flush()
 
     tournament = Tournament(name=data)
-    # Generate the UUID
-    uuid_len = 6
-    tries = 0
-    max_tries = 10
-    tournament_found = True
-    uuid = ''
-    while tournament_found:
-        if tries >= max_tries:
-            tries = 0
-            uuid_len += 1
-        tries += 1
-        uuid = generate_uuid(uuid_len)
-        tournament_found = db.session.query(Tournament).filter(tournament.uuid == uuid).first()
-    tournament.uuid = uuid
     tournament.name = data['name']
     tournament.max_participants = data['maxParticipants']
     if 'startDate' in data:
@@ -71,8 +281,7 @@ def create_tournament(payload):
     tournament.game_id = game.id
     user = auth.get_logged_user()
     tournament.creator_id = user.id
-    db.session.add(tournament)
-    db.session.flush()
+    tournament.add_with_public_id('t')
     db.session.commit()
     return jsonify(tournament.long()), 201
 
@@ -98,8 +307,3 @@ def delete_any_tournament(tournament_id):
         return errors.not_found_error('Tournament not found')
     tournament.delete()
     return '', 204
-
-
-def generate_uuid(length):
-    chars = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-    return 't' + ''.join(random.choices(chars, k=length))
@@ -0,0 +1,15 @@
+from sqlalchemy import or_
+
+
+def escape_like(term, escape='\\'):
+    return term.replace(escape, escape * 2).replace('%', escape + '%').replace('_', escape + '_')
+
+
+def search_filter(term, *columns):
+    """
+    search_filter(term, *columns)
+        case insensitive match of term anywhere in one of columns. On PostgreSQL the ILIKE is served by the
+        pg_trgm indexes declared in models (for terms of at least 3 chars), on SQLite it is a plain LIKE scan
+    """
+    pattern = '%{}%'.format(escape_like(term.strip()))
+    return or_(*[column.ilike(pattern, escape='\\') for column in columns])
@@ -0,0 +1,118 @@
+"""
+Test fixtures: the app on a throwaway SQLite database (or TEST_DATABASE_URL, whose tables are dropped after each
+test), with JWT signed by a test key served as JWKS.
+
+    python -m pytest tests
+"""
+import os
+import re
+import sys
+import time
+import base64
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///{}'.format(
+    os.path.join(tempfile.mkdtemp(), 'test.sqlite'))
+os.environ.setdefault('AUTH0_DOMAIN', 'test.invalid')
+os.environ.setdefault('AUTH0_API_AUDIENCE', 'test')
+os.environ.setdefault('JWT_ALGORITHMS', 'RS256')
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+class TokenSigner:
+    """
+    TokenSigner
+        RSA key signing test JWT, and the JWKS document publishing it
+    """
+
+    def __init__(self, audience):
+        from Crypto.PublicKey import RSA
+        key = RSA.generate(2048)
+        self.audience = audience
+        self.pem = key.exportKey().decode()
+        self.jwks = {'keys': [{'kty': 'RSA', 'kid': 'test', 'use': 'sig', 'alg': 'RS256',
+                               'n': self._b64(key.n), 'e': self._b64(key.e)}]}
+
+    @staticmethod
+    def _b64(number):
+        data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+    def headers(self, sub, permissions=()):
+        from jose import jwt
+        claims = {'sub': sub, 'aud': self.audience, 'permissions': list(permissions), 'exp': int(time.time()) + 3600}
+        token = jwt.encode(claims, self.pem, algorithm='RS256', headers={'kid': 'test'})
+        return {'Authorization': 'Bearer {}'.format(token)}
+
+
+def query_count(response):
+    """
+    query_count(response)
+        SQL queries run by the request of response, read from its Server-Timing header (see profiler.py)
+    """
+    return int(SERVER_TIMING_QUERIES.search(response.headers['Server-Timing']).group(1))
+
+
+@contextmanager
+def recorded_statements(engine):
+    """
+    recorded_statements(engine)
+        context collecting the (statement, parameters) executed on engine
+    """
+    from sqlalchemy import event
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture(scope='session')
+def signer():
+    return TokenSigner(os.environ['AUTH0_API_AUDIENCE'])
+
+
+@pytest.fixture(scope='session')
+def app(signer):
+    # Serve the test key before the app warms up its JWKS cache
+    import auth
+    auth.JWKS.fetcher = lambda: signer.jwks
+    auth.JWKS.clear()
+    from app import app
+    app.testing = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """
+    db
+        the models database, with empty tables created for the test (and in-process caches referring to previous
+        tests rows cleared)
+    """
+    import auth
+    from models import db
+    from routes.game import GAME_CACHE
+    with app.app_context():
+        db.create_all()
+    yield db
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    auth.USER_ID_CACHE.clear()
+    auth.TOKEN_CACHE.clear()
+    GAME_CACHE.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+import pytest
+import brackets
+from models import User, Tournament, TournamentParticipants, TournamentStanding
+
+
+@pytest.fixture
+def creator(client, signer):
+    headers = signer.headers('creator|1')
+    client.get('/user-auth0', headers=headers)  # Provision the creator
+    return headers
+
+
+def seed_tournament(app, db, n_players):
+    """
+    seed_tournament(app, db, n_players)
+        tournament t1 of the creator with n_players registered in seed order, return the players ids by seed
+    """
+    with app.app_context():
+        tournament = Tournament(uuid='t1', name='Cup', creator_id=User.get_by_oauth_id('creator|1').id)
+        users = [User(name='player {}'.format(i)) for i in range(n_players)]
+        db.session.add(tournament)
+        db.session.add_all(users)
+        db.session.flush()
+        start = datetime.now()
+        db.session.add_all([
+            TournamentParticipants(tournament_id=tournament.id, user_id=user.id,
+                                   participate_date=start + timedelta(seconds=seed))
+            for seed, user in enumerate(users)
+        ])
+        tournament.participant_count = n_players
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def bracket_matches(client):
+    """
+    bracket_matches(client)
+        matches of the t1 bracket by (bracket, round, position), players as user ids
+    """
+    response = client.get('/tournaments/t1/bracket')
+    assert response.status_code == 200
+    return {
+        (bracket, round['round'], match['position']): dict(
+            match, players=[player and player['id'] for player in match['players']])
+        for bracket, rounds in response.get_json()['brackets'].items()
+        for round in rounds for match in round['matches']
+    }
+
+
+def record(client, headers, match, winner_id):
+    return client.post('/tournaments/t1/matches/{}/result'.format(match['id']), json={'winnerId': winner_id},
+                       headers=headers)
+
+
+def standings(client):
+    response = client.get('/tournaments/t1/standings')
+    assert response.status_code == 200
+    return [(row['user']['id'], row['played'], row['wins'], row['losses'], row['eliminated'])
+            for row in response.get_json()['standings']]
+
+
+@pytest.mark.parametrize('n_players, size', [(2, 2), (3, 4), (5, 8), (8, 8), (9, 16)])
+def test_elimination_sizes(n_players, size):
+    assert brackets.bracket_size(brackets.SINGLE_ELIMINATION, n_players) == size
+    assert len(brackets.layout(brackets.SINGLE_ELIMINATION, n_players)) == size - 1
+
+
+@pytest.mark.parametrize('format, n_players', [
+    ('swiss', 4),
+    (brackets.SINGLE_ELIMINATION, 1),
+    (brackets.DOUBLE_ELIMINATION, 2),
+    (brackets.DOUBLE_ELIMINATION, 6),
+])
+def test_unsupported_sizes(format, n_players):
+    with pytest.raises(brackets.BracketError):
+        brackets.bracket_size(format, n_players)
+
+
+def test_layout_of_five_players_advances_byes():
+    layout = {(match['bracket'], match['round'], match['position']): match
+              for match in brackets.layout(brackets.SINGLE_ELIMINATION, 5)}
+    first_round = [layout[(brackets.WINNERS, 1, position)] for position in range(4)]
+    assert [match['players'] for match in first_round] == [[0, None], [3, 4], [1, None], [2, None]]
+    assert [match['winner'] for match in first_round] == [0, None, 1, 2]
+    assert layout[(brackets.WINNERS, 2, 0)]['players'] == [0, None]
+    assert layout[(brackets.WINNERS, 2, 1)]['players'] == [1, 2]
+    assert layout[(brackets.WINNERS, 3, 0)]['players'] == [None, None]
+
+
+def test_round_robin_layout_pairs_everyone_once():
+    layout = brackets.layout(brackets.ROUND_ROBIN, 5)
+    pairs = [tuple(sorted(match['players'])) for match in layout]
+    assert len(pairs) == len(set(pairs)) == 10
+    for round in range(1, 6):
+        players = [seed for match in layout if match['round'] == round for seed in match['players']]
+        assert len(players) == len(set(players)) == 4  # One player rests each round
+
+
+def test_five_players_bracket(app, client, db, creator):
+    players = seed_tournament(app, db, 5)
+    response = client.post('/tournaments/t1/bracket', json={'format': brackets.SINGLE_ELIMINATION}, headers=creator)
+    assert response.status_code == 201
+    assert response.get_json()['matches'] == 7
+    matches = bracket_matches(client)
+    assert matches[('winners', 1, 0)]['winner_id'] == players[0]
+    assert matches[('winners', 1, 1)]['players'] == [players[3], players[4]]
+    assert matches[('winners', 2, 0)]['players'] == [players[0], None]
+    assert matches[('winners', 2, 1)]['players'] == [players[1], players[2]]
+
+    assert record(client, creator, matches[('winners', 1, 1)], players[4]).status_code == 200
+    assert record(client, creator, matches[('winners', 2, 1)], players[2]).status_code == 200
+    matches = bracket_matches(client)
+    assert matches[('winners', 2, 0)]['players'] == [players[0], players[4]]
+    assert matches[('winners', 3, 0)]['players'] == [None, players[2]]
+    with app.app_context():
+        eliminated = {user_id for user_id, in db.session.query(TournamentStanding.user_id)
+                      .filter(TournamentStanding.eliminated == True)}
+    assert eliminated == {players[3], players[1]}
+
+
+def test_double_elimination_advances_winners_and_losers(app, client, db, creator):
+    players = seed_tournament(app, db, 4)
+    response = client.post('/tournaments/t1/bracket', json={'format': brackets.DOUBLE_ELIMINATION}, headers=creator)
+    assert response.status_code == 201
+    matches = bracket_matches(client)
+    assert matches[('winners', 1, 0)]['players'] == [players[0], players[3]]
+    assert matches[('winners', 1, 1)]['players'] == [players[1], players[2]]
+
+    record(client, creator, matches[('winners', 1, 0)], players[0])
+    record(client, creator, matches[('winners', 1, 1)], players[1])
+    matches = bracket_matches(client)
+    assert matches[('winners', 2, 0)]['players'] == [players[0], players[1]]
+    assert matches[('losers', 1, 0)]['players'] == [players[3], players[2]]
+    assert not any(row[4] for row in standings(client))  # First losses only drop into the losers bracket
+
+    record(client, creator, matches[('winners', 2, 0)], players[0])
+    record(client, creator, matches[('losers', 1, 0)], players[3])
+    matches = bracket_matches(client)
+    assert matches[('final', 1, 0)]['players'] == [players[0], None]
+    assert matches[('losers', 2, 0)]['players'] == [players[3], players[1]]
+
+    record(client, creator, matches[('losers', 2, 0)], players[1])
+    matches = bracket_matches(client)
+    assert matches[('final', 1, 0)]['players'] == [players[0], players[1]]
+    record(client, creator, matches[('final', 1, 0)], players[0])
+    assert standings(client) == [
+        (players[0], 3, 3, 0, False),
+        (players[1], 4, 2, 2, True),
+        (players[3], 3, 1, 2, True),
+        (players[2], 2, 0, 2, True),
+    ]
+
+
+def test_round_robin_standings(app, client, db, creator):
+    players = seed_tournament(app, db, 3)
+    response = client.post('/tournaments/t1/bracket', json={'format': brackets.ROUND_ROBIN}, headers=creator)
+    assert response.status_code == 201
+    matches = bracket_matches(client).values()
+    assert len(matches) == 3
+    for match in matches:
+        # Lower seeds win
+        assert record(client, creator, match, min(match['players'])).status_code == 200
+    assert standings(client) == [
+        (players[0], 2, 2, 0, False),
+        (players[1], 2, 1, 1, False),
+        (players[2], 2, 0, 2, False),
+    ]
+
+
+def test_rejected_results(app, client, db, creator, signer):
+    players = seed_tournament(app, db, 4)
+    client.post('/tournaments/t1/bracket', json={'format': brackets.SINGLE_ELIMINATION}, headers=creator)
+    matches = bracket_matches(client)
+    final, first = matches[('winners', 2, 0)], matches[('winners', 1, 0)]
+
+    response = record(client, creator, final, players[0])
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Match players are not known yet'
+    assert record(client, creator, first, players[1]).status_code == 400  # Not a player of the match
+    assert record(client, creator, first, 'x').status_code == 400
+    assert record(client, signer.headers('player|1'), first, players[0]).status_code == 403
+    assert record(client, creator, first, players[0]).status_code == 200
+    response = record(client, creator, first, players[3])
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Match result was already recorded'
+
+    assert bracket_matches(client)[('winners', 2, 0)]['players'] == [players[0], None]
+    assert standings(client)[0] == (players[0], 1, 1, 0, False)
+    # Registrations are closed once the bracket is generated
+    response = client.post('/tournaments/t1/participants', json={'add': [players[0]]}, headers=creator)
+    assert response.status_code == 400
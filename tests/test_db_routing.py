@@ -0,0 +1,45 @@
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine
+from models import db as models_db, User, Tournament
+
+
+@pytest.fixture
+def replica_app(app, db):
+    """
+    replica_app
+        an app reading from an empty replica of the test database, as a replica lagging behind every write
+    """
+    from app import create_app
+    replica_url = 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(), 'replica.sqlite'))
+    models_db.metadata.create_all(create_engine(replica_url))
+    os.environ['DATABASE_REPLICA_URLS'] = replica_url
+    try:
+        replica_app = create_app()
+    finally:
+        del os.environ['DATABASE_REPLICA_URLS']
+        models_db.app = app
+    replica_app.testing = True
+    yield replica_app
+    with replica_app.app_context():
+        models_db.session.remove()
+
+
+def test_reads_after_a_commit_stay_on_primary(app, replica_app, signer):
+    # First login creates the user on the primary, in a request routed to the replica
+    response = replica_app.test_client().get('/matches', headers=signer.headers('new|1'))
+    assert response.status_code == 200
+    with app.app_context():
+        assert User.get_by_oauth_id('new|1') is not None
+
+
+def test_reads_go_to_replica(app, replica_app):
+    with app.app_context():
+        models_db.session.add(Tournament(name='Cup', uuid='t1'))
+        models_db.session.commit()
+    response = replica_app.test_client().get('/tournaments')
+    assert response.status_code == 200
+    assert response.get_json()['total_tournaments'] == 0
+    with replica_app.app_context():
+        assert Tournament.query.count() == 1  # Outside requests the primary is used
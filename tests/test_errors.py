@@ -0,0 +1,10 @@
+from sqlalchemy.exc import IntegrityError
+import errors
+
+
+def test_server_error_hides_exception_details(app):
+    error = IntegrityError('INSERT INTO users (name) VALUES (?)', ('secret',), Exception('UNIQUE constraint failed'))
+    with app.test_request_context():
+        response, status = errors.server_error(error)
+    assert status == 500
+    assert response.get_json() == {'success': False, 'error': 500, 'message': 'Server Error'}
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import pytest
+from conftest import query_count, recorded_statements
+from models import Game, User, Match, MatchParticipants, Tournament
+
+
+def seed_matches(db, n_matches, tournament=None):
+    game = Game(name='Chess')
+    users = [User(name='player {}'.format(i)) for i in range(4)]
+    db.session.add(game)
+    db.session.add_all(users)
+    db.session.flush()
+    now = datetime.now()
+    for i in range(n_matches):
+        match = Match(name='match {}'.format(i), uuid='m{}'.format(i), game_id=game.id, creator_id=users[0].id,
+                      tournament_id=tournament.id if tournament else None, max_participants=4, participant_count=2,
+                      created_at=now - timedelta(minutes=i), updated_at=now)
+        db.session.add(match)
+        db.session.flush()
+        db.session.add_all([MatchParticipants(match_id=match.id, user_id=user.id) for user in users[i % 3:i % 3 + 2]])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('url', [
+    '/matches?perPage={}',
+    '/matches?perPage={}&expand=participants',
+    '/matches?cursor=&perPage={}&expand=participants',
+    '/matches?perPage={}&searchTerm=chess',
+])
+def test_matches_page_query_count_is_constant(app, client, db, url):
+    with app.app_context():
+        seed_matches(db, 60)
+    counts = {}
+    for per_page in (1, 10, 50):
+        response = client.get(url.format(per_page))
+        assert response.status_code == 200
+        assert len(response.get_json()['matches']) == per_page
+        counts[per_page] = query_count(response)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_tournament_matches_page_query_count_is_constant(app, client, db):
+    with app.app_context():
+        tournament = Tournament(name='Cup', uuid='t1')
+        db.session.add(tournament)
+        db.session.flush()
+        seed_matches(db, 30, tournament)
+    counts = {}
+    for per_page in (1, 10, 30):
+        response = client.get('/tournaments/t1/matches?perPage={}&expand=participants'.format(per_page))
+        assert len(response.get_json()['matches']) == per_page
+        counts[per_page] = query_count(response)
+    assert len(set(counts.values())) == 1, counts
+
+
+@pytest.mark.parametrize('view', ['short', 'long'])
+def test_view_options_load_pages_in_constant_queries(app, db, view):
+    with app.app_context():
+        seed_matches(db, 30)
+        counts = {}
+        for page_size in (1, 10, 30):
+            db.session.expunge_all()
+            with recorded_statements(db.engine) as statements:
+                matches = db.session.query(Match).options(*Match.view_options(view)) \
+                    .order_by(Match.id).limit(page_size).all()
+                items = [getattr(match, view)() for match in matches]
+            assert len(items) == page_size
+            assert all(len(item['participants']) == 2 for item in items)
+            counts[page_size] = len(statements)
+        assert len(set(counts.values())) == 1, counts
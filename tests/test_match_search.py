@@ -0,0 +1,60 @@
+from datetime import datetime
+import pytest
+from conftest import recorded_statements
+from models import Game, User, Match
+
+
+@pytest.fixture
+def matches(app, db):
+    with app.app_context():
+        chess, go = Game(name='Chess'), Game(name='Go')
+        user = User(name='player')
+        db.session.add_all([chess, go, user])
+        db.session.flush()
+        now = datetime.now()
+        for uuid, name, game in (('m1', 'Friday night', chess), ('m2', 'Chess club', go), ('m3', 'Sunday', go),
+                                 ('m4', '100% fun', None)):
+            db.session.add(Match(uuid=uuid, name=name, game_id=game.id if game else None, creator_id=user.id,
+                                 max_participants=2, created_at=now, updated_at=now))
+        db.session.commit()
+
+
+def search(client, term):
+    response = client.get('/matches', query_string={'searchTerm': term})
+    assert response.status_code == 200
+    return sorted(match['uuid'] for match in response.get_json()['matches'])
+
+
+def test_search_hits_match_name(client, matches):
+    assert search(client, 'friday') == ['m1']
+    assert search(client, 'SUN') == ['m3']
+
+
+def test_search_hits_game_name(client, matches):
+    assert search(client, 'go') == ['m2', 'm3']
+    # Either the match or its game name
+    assert search(client, 'chess') == ['m1', 'm2']
+
+
+def test_search_escapes_like_wildcards(client, matches):
+    assert search(client, '0%') == ['m4']
+    assert search(client, 'no_match') == []
+
+
+def test_search_joins_games_once(app, client, db, matches):
+    engine = db.get_engine(app)
+    with recorded_statements(engine) as statements:
+        assert search(client, 'chess') == ['m1', 'm2']
+    match_statements = [(statement, parameters) for statement, parameters in statements
+                        if 'FROM matches' in statement]
+    assert match_statements
+    for statement, parameters in match_statements:
+        assert statement.count('JOIN games') == 1, statement
+    if engine.dialect.name == 'sqlite':
+        # Query plan of the page query: games is looked up once per match, by primary key
+        statement, parameters = match_statements[-1]
+        with engine.connect() as connection:
+            plan = [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        games_steps = [step for step in plan if 'games' in step.split()]
+        assert len(games_steps) == 1, plan
+        assert games_steps[0].startswith('SEARCH games USING INTEGER PRIMARY KEY'), plan
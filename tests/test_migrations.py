@@ -0,0 +1,61 @@
+import os
+import tempfile
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade, downgrade
+from models import db as models_db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+BASELINE = '3f1c2a9d7b10'
+
+
+@pytest.fixture
+def migrated_app(app):
+    """
+    migrated_app
+        an app on an empty database, for migrations to build
+    """
+    from app import create_app
+    database_url = os.environ['DATABASE_URL']
+    os.environ['DATABASE_URL'] = 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(), 'migrated.sqlite'))
+    try:
+        migrated_app = create_app()
+    finally:
+        os.environ['DATABASE_URL'] = database_url
+        models_db.app = app
+    with migrated_app.app_context():
+        yield migrated_app
+        models_db.session.remove()
+
+
+def schema_differences():
+    with models_db.engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), models_db.metadata)
+
+
+def test_migrations_build_the_models_schema(migrated_app):
+    upgrade(MIGRATIONS)
+    assert schema_differences() == []
+    downgrade(MIGRATIONS, revision='base')
+    assert models_db.engine.table_names() == ['alembic_version']
+
+
+def test_upgrade_removes_duplicates_and_backfills_counters(migrated_app):
+    upgrade(MIGRATIONS, revision=BASELINE)
+    engine = models_db.engine
+    engine.execute("INSERT INTO users (id, name) VALUES (1, 'a'), (2, 'b'), (3, 'c')")
+    engine.execute("INSERT INTO user_accounts (user_id, oauth_id) VALUES (2, 'x'), (3, 'x'), (1, 'y')")
+    engine.execute("INSERT INTO matches (id, name, uuid, is_private, max_participants) VALUES (1, 'm', 'm1', 0, 4)")
+    engine.execute('INSERT INTO match_participants (match_id, user_id) VALUES (1, 1), (1, 2), (1, 1), (1, 1)')
+    engine.execute("INSERT INTO tournaments (id, name, uuid) VALUES (1, 't', 't1'), (2, 'u', 't2')")
+    engine.execute('INSERT INTO tournament_participants (tournament_id, user_id) VALUES (1, 3), (1, 3), (2, 3)')
+    upgrade(MIGRATIONS)
+
+    assert engine.execute('SELECT id, match_id, user_id FROM match_participants ORDER BY id').fetchall() == [
+        (1, 1, 1), (2, 1, 2)]
+    assert engine.execute('SELECT id, participant_count FROM matches').fetchall() == [(1, 2)]
+    assert engine.execute('SELECT id, participant_count FROM tournaments ORDER BY id').fetchall() == [(1, 1), (2, 1)]
+    assert engine.execute('SELECT COUNT(*) FROM tournaments WHERE created_at IS NULL').scalar() == 0
+    assert engine.execute('SELECT user_id, oauth_id FROM user_accounts ORDER BY oauth_id').fetchall() == [
+        (2, 'x'), (1, 'y')]
@@ -0,0 +1,101 @@
+import json
+import base64
+from datetime import datetime, timedelta
+import pytest
+from models import Game, User, Match, Tournament
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def walk(client, url, name, per_page):
+    """
+    walk(client, url, name, per_page)
+        ids of every item of a cursor paginated listing, following next_cursor from the first page
+    """
+    ids, next_cursor = [], ''
+    while next_cursor is not None:
+        response = client.get(url, query_string={'cursor': next_cursor, 'perPage': per_page})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data[name]) <= per_page
+        ids += [item['id'] for item in data[name]]
+        next_cursor = data['next_cursor']
+    return ids
+
+
+@pytest.fixture
+def tournaments(app, db):
+    # Duplicate and NULL names, so pages break inside runs of equal sort keys
+    with app.app_context():
+        names = ['b', None, 'a', 'b', None, 'c', 'b', None, 'a']
+        db.session.add_all([Tournament(name=name, uuid='t{}'.format(i)) for i, name in enumerate(names)])
+        db.session.commit()
+        return [tournament.id for tournament in Tournament.query.order_by(Tournament.id)]
+
+
+@pytest.fixture
+def matches(app, db):
+    with app.app_context():
+        user = User(name='player')
+        db.session.add(user)
+        db.session.flush()
+        now = datetime.now()
+        created = [now, None, now - timedelta(minutes=1), now, None, now - timedelta(minutes=2), now]
+        db.session.add_all([Match(name='m', uuid='m{}'.format(i), creator_id=user.id, max_participants=2)
+                            for i in range(len(created))])
+        db.session.flush()
+        for i, match in enumerate(Match.query.order_by(Match.id)):
+            match.created_at = created[i]
+        db.session.commit()
+        return created
+
+
+@pytest.mark.parametrize('per_page', [1, 2, 4, 100])
+def test_cursor_pages_cover_nullable_sort_keys(client, tournaments, per_page):
+    ids = walk(client, '/tournaments', 'tournaments', per_page)
+    assert sorted(ids) == tournaments
+    # Names ascending, NULL names last, ties by id
+    assert ids == [3, 9, 1, 4, 7, 6, 2, 5, 8]
+
+
+@pytest.mark.parametrize('per_page', [1, 3, 100])
+def test_descending_cursor_pages_cover_nullable_sort_keys(client, matches, per_page):
+    ids = walk(client, '/matches', 'matches', per_page)
+    # Newest first, NULL dates first, ties by id descending
+    assert ids == [5, 2, 7, 4, 1, 3, 6]
+
+
+def test_numbered_pages(client, tournaments):
+    response = client.get('/tournaments', query_string={'page': 2, 'perPage': 4})
+    data = response.get_json()
+    assert (data['total_tournaments'], data['page'], data['pages']) == (9, 2, 3)
+    assert len(data['tournaments']) == 4
+
+
+@pytest.mark.parametrize('url, values', [
+    ('/matches', ['2020-01-01', None]),
+    ('/matches', ['yesterday', 1]),
+    ('/matches', [1, 1]),
+    ('/games', [None, None]),
+    ('/games', [{'a': 1}, 1]),
+    ('/games', ['a', '1']),
+    ('/games', ['a', True]),
+    ('/tournaments', [[1], 1]),
+    ('/tournaments', ['a']),
+    ('/tournaments', {'name': 'a'}),
+])
+def test_invalid_cursor_is_rejected(client, db, url, values):
+    response = client.get(url, query_string={'cursor': cursor(values)})
+    assert response.status_code == 400
+
+
+def test_garbage_cursor_is_rejected(client, db):
+    assert client.get('/matches', query_string={'cursor': '!!!'}).status_code == 400
+
+
+def test_null_sort_key_cursor_is_accepted(client, tournaments):
+    response = client.get('/tournaments', query_string={'cursor': cursor([None, 2]), 'perPage': 10})
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()['tournaments']] == [5, 8]
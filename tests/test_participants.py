@@ -0,0 +1,98 @@
+import threading
+import pytest
+from sqlalchemy.exc import IntegrityError
+from models import Game, User, Match, MatchParticipants
+
+
+@pytest.fixture
+def match(app, db):
+    with app.app_context():
+        game, creator = Game(name='Chess'), User(name='creator')
+        db.session.add_all([game, creator])
+        db.session.flush()
+        match = Match(uuid='m1', name='Open match', game_id=game.id, creator_id=creator.id, max_participants=5)
+        db.session.add(match)
+        db.session.commit()
+        return match.id
+
+
+def participants(db, match_id):
+    count = db.session.query(Match.participant_count).filter(Match.id == match_id).scalar()
+    rows = db.session.query(MatchParticipants).filter(MatchParticipants.match_id == match_id).count()
+    return count, rows
+
+
+def test_concurrent_joins_never_exceed_capacity(app, client, db, signer, match):
+    players = [signer.headers('player|{}'.format(i)) for i in range(20)]
+    for headers in players:
+        client.get('/user-auth0', headers=headers)  # Provision users up front
+    start = threading.Barrier(len(players))
+    statuses = []
+
+    def join(headers):
+        thread_client = app.test_client()
+        start.wait()
+        response = thread_client.patch('/matches/{}'.format(match), json={'action': 'join'}, headers=headers)
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=join, args=(headers,)) for headers in players]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [204] * 5 + [400] * 15
+    with app.app_context():
+        assert participants(db, match) == (5, 5)
+
+
+def test_join_twice_is_rejected(app, client, db, signer, match):
+    headers = signer.headers('player|1')
+    assert client.patch('/matches/{}'.format(match), json={'action': 'join'}, headers=headers).status_code == 204
+    response = client.patch('/matches/{}'.format(match), json={'action': 'join'}, headers=headers)
+    assert response.status_code == 400
+    with app.app_context():
+        assert participants(db, match) == (1, 1)
+        joined_match = Match.query.get(match)
+        assert joined_match.join(joined_match.participants[0].id) == Match.ALREADY_JOINED
+
+
+def test_unique_participation(app, db, match):
+    with app.app_context():
+        user = User(name='player')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(MatchParticipants(match_id=match, user_id=user.id))
+        db.session.commit()
+        db.session.add(MatchParticipants(match_id=match, user_id=user.id))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_recount_fixes_counters(app, db, match):
+    with app.app_context():
+        users = [User(name='player {}'.format(i)) for i in range(3)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([MatchParticipants(match_id=match, user_id=user.id) for user in users])
+        db.session.commit()
+        assert Match.recount_participants(fix=False) == 1
+        assert Match.recount_participants() == 1
+        db.session.commit()
+        assert participants(db, match) == (3, 3)
+        assert Match.recount_participants(fix=False) == 0
+
+
+def test_recount_command_check_fails_on_wrong_counters(app, db, match):
+    import commands
+    runner = app.test_cli_runner()
+    assert runner.invoke(commands.recount_participants_command, ['--check']).exit_code == 0
+    with app.app_context():
+        db.session.execute(Match.__table__.update().values(participant_count=2))
+        db.session.commit()
+    result = runner.invoke(commands.recount_participants_command, ['--check'])
+    assert result.exit_code == 1
+    assert 'Wrong participant_count of 1 matches' in result.output
+    assert runner.invoke(commands.recount_participants_command, []).exit_code == 0
+    assert runner.invoke(commands.recount_participants_command, ['--check']).exit_code == 0
@@ -0,0 +1,125 @@
+import pytest
+from models import Game, User, Match, MatchParticipants, Tournament, TournamentParticipants
+
+
+@pytest.fixture
+def creator(client, signer):
+    headers = signer.headers('creator|1')
+    client.get('/user-auth0', headers=headers)  # Provision the creator
+    return headers
+
+
+@pytest.fixture
+def players(app, db):
+    with app.app_context():
+        users = [User(name='player {}'.format(i)) for i in range(4)]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+@pytest.fixture
+def match(app, db, creator, players):
+    with app.app_context():
+        game = Game(name='Chess')
+        db.session.add(game)
+        db.session.flush()
+        match = Match(uuid='m1', name='Open match', game_id=game.id, creator_id=User.get_by_oauth_id('creator|1').id,
+                      max_participants=3)
+        db.session.add(match)
+        db.session.commit()
+        return match.id
+
+
+@pytest.fixture
+def tournament(app, db, creator, players):
+    with app.app_context():
+        tournament = Tournament(uuid='t1', name='Cup', creator_id=User.get_by_oauth_id('creator|1').id,
+                                max_participants=8)
+        db.session.add(tournament)
+        db.session.commit()
+        return tournament.uuid
+
+
+def match_participants(db, match_id):
+    return sorted(user_id for user_id, in db.session.query(MatchParticipants.user_id)
+                  .filter(MatchParticipants.match_id == match_id))
+
+
+def test_match_batch_adds_and_removes(app, client, db, creator, players, match):
+    url = '/matches/{}/participants'.format(match)
+    response = client.post(url, json={'add': players + [999999]}, headers=creator)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['added'] == players[:3]
+    assert report['rejected'] == players[3:]
+    assert report['missing'] == [999999]
+    assert report['participant_count'] == 3
+
+    response = client.post(url, json={'add': [players[0]], 'remove': [players[1]]}, headers=creator)
+    report = response.get_json()
+    assert report['already_joined'] == [players[0]]
+    assert report['removed'] == 1
+    assert report['participant_count'] == 2
+    with app.app_context():
+        assert match_participants(db, match) == [players[0], players[2]]
+        assert Match.query.get(match).participant_count == 2
+
+
+@pytest.mark.parametrize('data', [
+    {},
+    [1, 2],
+    {'add': 5},
+    {'add': '1,2'},
+    {'add': ['x']},
+    {'add': [1.5]},
+    {'add': [True]},
+    {'add': [1], 'remove': None},
+    {'remove': {'id': 1}},
+])
+def test_match_batch_rejects_invalid_lists(app, client, db, creator, match, data):
+    response = client.post('/matches/{}/participants'.format(match), json=data, headers=creator)
+    assert response.status_code == 400
+    with app.app_context():
+        assert match_participants(db, match) == []
+
+
+def test_match_batch_is_for_the_creator_only(client, db, signer, players, match):
+    response = client.post('/matches/{}/participants'.format(match), json={'add': players},
+                           headers=signer.headers('player|1'))
+    assert response.status_code == 403
+    assert client.post('/matches/0/participants', json={'add': players},
+                       headers=signer.headers('player|1')).status_code == 404
+
+
+@pytest.mark.parametrize('data', [{'join': 1}, {'join': ['1']}, {'remove': 'all'}])
+def test_match_edit_rejects_invalid_lists(app, client, db, creator, match, data):
+    data.update(action='edit', name='Renamed')
+    response = client.patch('/matches/{}'.format(match), json=data, headers=creator)
+    assert response.status_code == 400
+    with app.app_context():
+        assert Match.query.get(match).name == 'Open match'
+
+
+def test_match_edit_updates_participants(app, client, db, creator, players, match):
+    response = client.patch('/matches/{}'.format(match), json={'action': 'edit', 'join': players[:2]},
+                            headers=creator)
+    assert response.status_code == 200
+    assert response.get_json()['participants_report']['added'] == players[:2]
+    with app.app_context():
+        assert match_participants(db, match) == players[:2]
+
+
+def test_tournament_batch(app, client, db, creator, players, tournament):
+    url = '/tournaments/{}/participants'.format(tournament)
+    response = client.post(url, json={'add': players, 'remove': []}, headers=creator)
+    assert response.status_code == 200
+    assert response.get_json()['added'] == players
+    response = client.post(url, json={'remove': players[:1]}, headers=creator)
+    assert response.get_json()['removed'] == 1
+    assert response.get_json()['participant_count'] == 3
+    assert client.post(url, json={'add': 1}, headers=creator).status_code == 400
+    assert client.post(url, json={'remove': [None]}, headers=creator).status_code == 400
+    with app.app_context():
+        assert db.session.query(TournamentParticipants).count() == 3
+        assert Tournament.query.filter(Tournament.uuid == tournament).first().participant_count == 3
@@ -0,0 +1,34 @@
+import re
+import pytest
+import profiler
+from models import Game
+
+SERVER_TIMING = re.compile(r'db;dur=([\d.-]+);desc="(\d+) queries"')
+
+
+def test_failed_statements_leave_no_timing_state(app, db):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            info = dict(connection.info)
+            for _ in range(3):
+                with pytest.raises(Exception):
+                    connection.execute('SELECT * FROM missing_table')
+            assert dict(connection.info) == info
+
+
+def test_server_timing_reports_request_queries(app, client, db):
+    with app.app_context():
+        db.session.add(Game(name='Chess'))
+        db.session.commit()
+    duration, count = SERVER_TIMING.search(client.get('/games/1').headers['Server-Timing']).groups()
+    assert int(count) == 1
+    assert 0 <= float(duration) < 1000
+
+
+def test_query_budget_fails_in_tests(app, client, db):
+    app.config['SQL_QUERY_BUDGET'] = 0
+    try:
+        with pytest.raises(profiler.QueryBudgetExceeded):
+            client.get('/games/1')
+    finally:
+        app.config['SQL_QUERY_BUDGET'] = None
@@ -0,0 +1,15 @@
+from commands import unindexed_foreign_keys
+from models import db
+
+
+def test_every_foreign_key_is_indexed():
+    assert unindexed_foreign_keys(db.metadata) == []
+
+
+def test_unindexed_foreign_key_is_reported():
+    from sqlalchemy import MetaData, Table, Column, Integer, ForeignKey
+    metadata = MetaData()
+    Table('parents', metadata, Column('id', Integer, primary_key=True))
+    Table('children', metadata, Column('id', Integer, primary_key=True),
+          Column('parent_id', Integer, ForeignKey('parents.id')))
+    assert unindexed_foreign_keys(metadata) == ['children(parent_id)']